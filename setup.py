@@ -69,6 +69,7 @@ setup(
         "zc.lockfile==2.0",
         "zipp==3.1.0; python_version < '3.8'",
     ],
+    extras_require={"xxhash": ["xxhash"]},
     dependency_links=[],
     packages=["video_file_organizer"],
     include_package_data=True,
@@ -5,6 +5,7 @@ import os
 import zipfile
 
 from tests.vars import ASSETS_DIR
+from video_file_organizer.utils import Observer, Observee
 
 
 @pytest.fixture
@@ -54,3 +55,42 @@ def sample_series_dirs():
 
     yield [series_dir_series, series_dir_anime]
     shutil.rmtree(tmp_dir)
+
+
+@pytest.fixture
+def transfer_dirs(tmp_dir):
+    """Returns an empty input dir and output dir inside tmp_dir"""
+    input_dir = os.path.join(tmp_dir, 'input')
+    output_dir = os.path.join(tmp_dir, 'output')
+    os.mkdir(input_dir)
+    os.mkdir(output_dir)
+    return input_dir, output_dir
+
+
+class Recorder(Observer):
+    """Observer keeping the topics and kwargs it's notified of"""
+
+    def __init__(self, topics=None):
+        self.topics = topics
+        self.received: list = []
+
+    def update(self, *args, topic, **kwargs):
+        self.received.append((topic, kwargs))
+
+    @property
+    def topics_received(self) -> list:
+        return [topic for topic, _ in self.received]
+
+    @property
+    def transferred(self) -> list:
+        return [kwargs['vfile'] for topic, kwargs in self.received
+                if topic == 'on_transfer']
+
+
+@pytest.fixture
+def recorder():
+    """Returns a Recorder attached to every topic for the test"""
+    recorder = Recorder()
+    Observee.attach(recorder)
+    yield recorder
+    Observee.detach(recorder)
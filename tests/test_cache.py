@@ -0,0 +1,81 @@
+import os
+
+from video_file_organizer.cache import ScanIndex, MetadataCache
+from video_file_organizer.models import VideoCollection
+
+VIDEOEXTENSIONS = ['mkv', 'mp4']
+
+
+def scan(input_dir, scan_index):
+    return VideoCollection(
+        input_dir,
+        videoextensions=VIDEOEXTENSIONS,
+        scan_index=scan_index,
+        max_depth=2)
+
+
+def test_scan_index_reuses_unchanged_entries(tmp_dir, sample_input_dir):
+    index_path = os.path.join(tmp_dir, 'scan_index.json')
+
+    scan_index = ScanIndex(index_path)
+    first = sorted(vfile.path for vfile in scan(sample_input_dir, scan_index))
+    scan_index.save()
+
+    scan_index = ScanIndex(index_path)
+    collection = scan(sample_input_dir, scan_index)
+    folder = os.path.join(
+        sample_input_dir, 'Vikings.S05E10.HDTV.x264-KILLERS[rarbg]')
+    stat = os.stat(folder)
+    assert scan_index.lookup(folder, stat) is not None
+
+    second = sorted(vfile.path for vfile in collection)
+    assert first == second
+
+    # A new file in a nested directory is picked up
+    new_file = os.path.join(
+        sample_input_dir, 'Lucifer.S03E13.PROPER.WEBRip.x264-ION10', 'Subs',
+        'Lucifer.S03E13.Extra.mkv')
+    open(new_file, 'w').close()
+    scan_index = ScanIndex(index_path)
+    collection = scan(sample_input_dir, scan_index)
+    assert new_file in [vfile.path for vfile in collection]
+
+
+def test_scan_index_skips_unmatched(tmp_dir, sample_input_dir):
+    index_path = os.path.join(tmp_dir, 'scan_index.json')
+    unknown = os.path.join(sample_input_dir, 'An.Unknown.Series.S05E05.mkv')
+
+    scan_index = ScanIndex(index_path)
+    scan_index.fingerprint = 'configs-v1'
+    list(scan(sample_input_dir, scan_index))
+    scan_index.mark_unmatched(unknown)
+    scan_index.save()
+
+    scan_index = ScanIndex(index_path)
+    scan_index.fingerprint = 'configs-v1'
+    paths = [vfile.path for vfile in scan(sample_input_dir, scan_index)]
+    assert unknown not in paths
+
+    # A change in the configs retries the file
+    scan_index = ScanIndex(index_path)
+    scan_index.fingerprint = 'configs-v2'
+    paths = [vfile.path for vfile in scan(sample_input_dir, scan_index)]
+    assert unknown in paths
+
+
+def test_metadata_cache(tmp_dir):
+    cache_path = os.path.join(tmp_dir, 'metadata_cache.sqlite')
+    name = 'The.Flash.2014.S04E16.HDTV.x264-SVA.mkv'
+
+    cache = MetadataCache(cache_path, max_entries=2)
+    assert cache.get(name) is None
+    cache.set(name, {'title': 'The Flash', 'season': 4, 'episode': 16})
+    cache.set('b.mkv', {'title': 'b'})
+    cache.set('c.mkv', {'title': 'c'})
+    assert cache.get(name)['title'] == 'The Flash'
+    cache.save()
+
+    cache = MetadataCache(cache_path, max_entries=2)
+    assert cache.get(name)['episode'] == 16
+    assert cache.get('b.mkv') is None
+    assert cache.get('c.mkv') == {'title': 'c'}
@@ -0,0 +1,43 @@
+import difflib
+import os
+
+from random import Random
+
+from video_file_organizer.fuzzy import TrigramIndex
+
+TITLES = [
+    'The Flash', 'Brooklyn Nine-Nine', 'Marvels Agents of S.H.I.E.L.D.',
+    'lucifer', 'Boruto', 'Gintama', 'One Punch Man', 'Game of Thrones',
+    'An Unknown Series',
+]
+
+
+def test_trigram_index_agrees_with_difflib(sample_series_dirs):
+    names = [name for path in sample_series_dirs for name in os.listdir(path)]
+    index = TrigramIndex(names)
+
+    for title in TITLES:
+        assert index.get_close_matches(title, n=1, cutoff=0.6) == \
+            difflib.get_close_matches(title, names, n=1, cutoff=0.6)
+
+
+def test_trigram_index_agrees_with_difflib_on_near_ties():
+    random = Random(5)
+    words = ['Heroes', 'Lost', 'House', 'Fringe', 'Dark', 'Bones', 'Castle',
+             'Monk', 'Angel', 'Glee', 'Girls', 'Chuck', 'Fargo', 'Suits']
+    names = set(['Heroes', 'A Heroes', 'The Heroes'])
+    while len(names) < 600:
+        names.add(' '.join(random.sample(words, random.randint(1, 3))))
+    names = sorted(names)
+    index = TrigramIndex(names)
+
+    titles = ['feroes']
+    for _ in range(150):
+        title = list(random.choice(names))
+        title[random.randrange(len(title))] = random.choice('abcdefgh ')
+        titles.append(''.join(title))
+
+    for title in titles:
+        for n, cutoff in [(1, 0.6), (1, 0.7), (3, 0.6)]:
+            assert index.get_close_matches(title, n=n, cutoff=cutoff) == \
+                difflib.get_close_matches(title, names, n=n, cutoff=cutoff)
@@ -0,0 +1,63 @@
+import os
+import json
+import time
+
+from .utils import ConfigFileInjector
+
+from video_file_organizer.config import ConfigFile
+from video_file_organizer.hooks import HookRunner
+from video_file_organizer.models import VideoFile
+
+
+def test_hooks_run_in_background(tmp_dir):
+    output = os.path.join(tmp_dir, 'output')
+    hooks = HookRunner(workers=2, timeout=0.5)
+
+    started = time.monotonic()
+    hooks.submit(['sleep 5', f'echo first >> {output}'])
+    hooks.submit(['exit 1', f'echo second >> {output}'])
+    assert time.monotonic() - started < 0.5
+    hooks.close()
+
+    # The timeout and the failure don't stop the scripts after them
+    assert hooks.failures == 2
+    with open(output) as f:
+        assert sorted(f.read().split()) == ['first', 'second']
+
+
+def test_hooks_input(tmp_dir):
+    output = os.path.join(tmp_dir, 'output')
+    hooks = HookRunner()
+    hooks.submit([f'cat > {output}'], input=b'[1, 2]')
+    hooks.close()
+
+    with open(output) as f:
+        assert f.read() == '[1, 2]'
+
+
+def test_on_batch_complete_by_series(tmp_dir):
+    config_injector = ConfigFileInjector(tmp_dir)
+    config_injector.update({
+        "series_dirs": [tmp_dir],
+        "input_dir": tmp_dir,
+        "on_batch_complete": [
+            f"cat > {tmp_dir}/'{{{{ series }}}}-{{{{ count }}}}.json'"],
+        "on_batch_group": "series"
+    })
+    config = ConfigFile(config_injector.path)
+
+    vfiles = [
+        VideoFile(
+            name=f'{title}.S01E0{episode}.mkv',
+            metadata={'title': title, 'season': 1, 'episode': episode},
+            transfer={'transfer_to': tmp_dir})
+        for title, episode in [('Arrow', 1), ('Lucifer', 1), ('Arrow', 2)]]
+    config.update(topic='on_batch_complete', vfiles=vfiles)
+    config.hooks.close()
+
+    with open(os.path.join(tmp_dir, 'Arrow-2.json')) as f:
+        data = json.load(f)
+    assert [item['episode'] for item in data] == [1, 2]
+    assert data[0]['destination'] == \
+        os.path.join(tmp_dir, 'Arrow.S01E01.mkv')
+    assert os.path.exists(os.path.join(tmp_dir, 'Lucifer-1.json'))
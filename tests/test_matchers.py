@@ -0,0 +1,100 @@
+import os
+
+from .utils import RuleBookFileInjector
+from .vars import SERIES_CONFIGPARSE
+
+from video_file_organizer.config import RuleBookFile, SeriesRules
+from video_file_organizer.matchers import MetadataMatcher, \
+    OutputFolderMatcher, RuleBookMatcher
+from video_file_organizer.models import FolderCollection, VideoFile
+from video_file_organizer.utils import MatchMemo
+
+FILENAMES = [
+    "The.Flash.2014.S04E16.HDTV.x264-SVA.mkv",
+    "[HorribleSubs] Gintama - 353 [480p].mkv",
+    "Brooklyn.Nine-Nine.S05E13.HDTV.x264-SVA.mkv",
+    "[HorribleSubs] One Punch Man S2 - 03 [480p].mkv",
+    "random_file.mkv",
+]
+
+
+def test_metadata_matcher_parse_all_in_order():
+    serial = [VideoFile(name=name) for name in FILENAMES]
+    parallel = [VideoFile(name=name) for name in FILENAMES]
+
+    list(MetadataMatcher(workers=1).parse_all(serial))
+    results = list(MetadataMatcher(workers=2).parse_all(parallel))
+
+    assert [vfile.name for vfile in results] == FILENAMES
+    for vfile, expected in zip(results, serial):
+        assert vfile.metadata == expected.metadata
+        assert vfile.valid == expected.valid
+
+
+def test_series_rules():
+    series = SeriesRules([
+        ("Marvel's Agents of Sheild", 'season'),
+        ('One Piece', 'sub-dir "One Piece Episodes" episode-only'),
+        ('Gintama', None),
+    ])
+
+    # Normalized exact hit
+    assert series.match('marvel s agents of sheild') == \
+        "Marvel's Agents of Sheild"
+    # Fuzzy hit and miss
+    assert series.match('One Pice') == 'One Piece'
+    assert series.match('An Unknown Series') is None
+    # Rules are split ahead of time
+    assert series.get_rules('One Piece') == \
+        ('sub-dir', 'One Piece Episodes', 'episode-only')
+    assert series.get_rules('Gintama') == ()
+    assert series.names == (
+        "Marvel's Agents of Sheild", 'One Piece', 'Gintama')
+
+
+def test_rulebook_matcher_alternative_title(tmp_dir):
+    rule_book_injector = RuleBookFileInjector(tmp_dir)
+    rule_book_injector.update('series', SERIES_CONFIGPARSE)
+    matcher = RuleBookMatcher(RuleBookFile(rule_book_injector.path))
+    assert matcher.rulebook.series.match('Boruto') is None
+
+    rules = matcher.get_rules(
+        name='[HorribleSubs] Boruto - Naruto Next Generations - 50.mkv',
+        metadata={'type': 'episode', 'title': 'Boruto',
+                  'alternative_title': 'Naruto Next Generations'})
+    assert rules == {'rules': ['parent-dir', 'episode-only', 'alt-title']}
+
+
+def test_match_memo_shared_between_matchers(tmp_dir):
+    os.mkdir(os.path.join(tmp_dir, 'series'))
+    for name in ['Arrow', 'Lucifer']:
+        os.mkdir(os.path.join(tmp_dir, 'series', name))
+    rule_book_injector = RuleBookFileInjector(tmp_dir)
+    rule_book_injector.update('series', {'Arrow': 'season'})
+
+    memo = MatchMemo()
+    rulebook_matcher = RuleBookMatcher(
+        RuleBookFile(rule_book_injector.path), memo)
+    folder_matcher = OutputFolderMatcher(
+        FolderCollection(os.path.join(tmp_dir, 'series')), memo)
+    computed = []
+    close_matches = folder_matcher.index.get_close_matches
+
+    def counted_close_matches(*args, **kwargs):
+        computed.append(args)
+        return close_matches(*args, **kwargs)
+    folder_matcher.index.get_close_matches = counted_close_matches
+
+    for episode in range(1, 4):
+        metadata = {'type': 'episode', 'title': 'Arrow',
+                    'alternative_title': None}
+        name = f'Arrow.S01E0{episode}.mkv'
+        assert rulebook_matcher.get_rules(name=name, metadata=metadata)
+        assert folder_matcher.get_match(
+            name=name, metadata=metadata)['foldermatch'].name == 'Arrow'
+
+    assert len(computed) == 1
+    assert memo.hits == {'rulebook': 2, 'outputfolder': 2}
+    assert memo.misses == {'rulebook': 1, 'outputfolder': 1}
+    assert memo.summary() == \
+        'outputfolder 2 hits/1 misses, rulebook 2 hits/1 misses'
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from video_file_organizer.models import FolderCollection, VideoCollection, \
+    VideoFile
+
+
+def test_folder_collection_name_index(tmp_dir):
+    os.mkdir(os.path.join(tmp_dir, 'Arrow'))
+    os.mkdir(os.path.join(tmp_dir, 'Lucifer'))
+
+    folder = FolderCollection(tmp_dir)
+    assert sorted(folder.list_entry_names()) == ['Arrow', 'Lucifer']
+    assert folder.get_entry_by_name('Arrow').path == \
+        os.path.join(tmp_dir, 'Arrow')
+    with pytest.raises(KeyError):
+        folder.get_entry_by_name('Vikings')
+
+    # Reassigning the entries resets the index
+    os.mkdir(os.path.join(tmp_dir, 'Vikings'))
+    folder.entries = folder.scan()
+    assert 'Vikings' in folder.list_entry_names()
+    assert folder.get_entry_by_name('Vikings').name == 'Vikings'
+
+
+def test_video_collection_walk(tmp_dir):
+    release = os.path.join(tmp_dir, 'Show.S01E01.720p-GRP')
+    os.makedirs(os.path.join(release, 'Sample'))
+    os.makedirs(os.path.join(release, 'Extras', 'Deeper'))
+    for path in [
+        os.path.join(release, 'Show.S01E01.720p-GRP.mkv'),
+        os.path.join(release, 'Show.S01E01.720p-GRP.nfo'),
+        os.path.join(release, 'Sample', 'show.s01e01.sample.mkv'),
+        os.path.join(release, 'Extras', 'Show.S01E01.Extra.mkv'),
+        os.path.join(release, 'Extras', 'Deeper', 'Show.S01E01.Deep.mkv'),
+        os.path.join(tmp_dir, 'Show.S01E02.part.mkv'),
+    ]:
+        open(path, 'w').close()
+
+    collection = VideoCollection(
+        tmp_dir, ignore=['*.part.*'], videoextensions=['mkv'])
+    names = [vfile.name for vfile in collection]
+    assert names == ['Show.S01E01.720p-GRP.mkv']
+
+    # Deeper walks are opted into
+    collection = VideoCollection(
+        tmp_dir, ignore=['*.part.*'], videoextensions=['mkv'], max_depth=2)
+    names = sorted(vfile.name for vfile in collection)
+
+    assert names == ['Show.S01E01.720p-GRP.mkv', 'Show.S01E01.Extra.mkv']
+    for vfile in collection:
+        assert vfile.root_path == release
+
+
+def test_video_file_get_attr():
+    vfile = VideoFile(name='Arrow.S06E10.mkv', path='/input/Arrow.S06E10.mkv')
+
+    assert not hasattr(vfile, '__dict__')
+    attrs = vfile.get_attr()
+    assert list(attrs) == list(VideoFile.__slots__)
+    assert attrs['name'] == 'Arrow.S06E10.mkv'
+    assert attrs['valid'] is True
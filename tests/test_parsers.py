@@ -0,0 +1,49 @@
+import guessit
+import pytest
+
+from video_file_organizer.parsers import FastParser
+
+KEYS = ['title', 'alternative_title', 'year', 'season', 'episode',
+        'screen_size', 'release_group', 'container', 'type']
+
+FAST_PATH_NAMES = [
+    "The.Flash.2014.S04E16.HDTV.x264-SVA.mkv",
+    "Brooklyn.Nine-Nine.S05E13.HDTV.x264-SVA.mkv",
+    "lucifer.s03e06.web.PROPER.x264-tbs.mkv",
+    "Fresh.Off.the.Boat.S04E14.WEBRip.x264-ION10.mp4",
+    "Show.Name.S01E02.1080p.WEB.x264-GRP.mkv",
+    "Show.Name.S01E02.1080p.AMZN.WEB-DL.mkv",
+    "Show.Name.S01E02.1080p.WEB-DL-GRP.mkv",
+    "Show.Name.S01E02.DVD-Rip.mkv",
+    "Show.Name.S01E02.HDTV-LOL.mkv",
+    "[HorribleSubs] Gintama - 353 [480p].mkv",
+    "[HorribleSubs] Boruto - Naruto Next Generations - 50 [480p].mkv",
+    "Breaking Bad - S05E05 - Dead Freight.mp4",
+]
+
+GUESSIT_NAMES = [
+    "Marvels.Agents.of.S.H.I.E.L.D.S05E14.HDTV.x264-SVA.mkv",
+    "[HorribleSubs] One Punch Man S2 - 03 [480p].mkv",
+    "Show.Name.US.S01E02.mkv",
+    "Show.S01E01E02.mkv",
+    "The Office (US) - S05E07 - Business Trip.avi",
+    "One_Piece_533.mp4",
+]
+
+
+@pytest.mark.parametrize("name", FAST_PATH_NAMES)
+def test_fast_path_agrees_with_guessit(name):
+    parser = FastParser()
+    results = parser.parse(name)
+    expected = dict(guessit.guessit(name))
+
+    assert parser.hits == 1
+    for key in KEYS:
+        assert results.get(key) == expected.get(key)
+
+
+@pytest.mark.parametrize("name", GUESSIT_NAMES)
+def test_fast_path_falls_back(name):
+    parser = FastParser()
+    assert parser.parse(name) is None
+    assert parser.misses == 1
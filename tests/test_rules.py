@@ -0,0 +1,48 @@
+import os
+
+import video_file_organizer.rules  # noqa: F401
+from video_file_organizer.models import FolderCollection
+from video_file_organizer.rules import series
+from video_file_organizer.rules.utils import RuleRegistry
+
+TOPIC = 'OutputFolderMatcher/after'
+
+
+def test_rule_pipeline():
+    rules = ('format-title', 'Show_{{ episode }}', 'episode-only', 'season')
+    pipeline = RuleRegistry.get_pipeline(rules, TOPIC)
+
+    # Sorted by order, then by registration
+    assert [getattr(rule, 'func', rule) for rule in pipeline] == [
+        series.rule_season, series.rule_episode_only,
+        series.rule_format_title]
+    assert pipeline[2].keywords == {'title_format': 'Show_{{ episode }}'}
+    assert RuleRegistry.get_pipeline(rules, TOPIC) is pipeline
+
+
+def test_rule_pipeline_argument_isnt_a_rule():
+    pipeline = RuleRegistry.get_pipeline(('sub-dir', 'season'), TOPIC)
+    assert len(pipeline) == 1
+    assert pipeline[0].func is series.rule_sub_dir
+    assert pipeline[0].keywords == {'subdir_name': 'season'}
+
+
+def test_rule_season(tmp_dir):
+    show = os.path.join(tmp_dir, 'Show')
+    for name in ['Season 10', 'Season 1', 'Season 2 (2012)']:
+        os.makedirs(os.path.join(show, name))
+    open(os.path.join(show, 'Season 3.nfo'), 'w').close()
+    foldermatch = FolderCollection(tmp_dir).get_entry_by_name('Show')
+
+    def transfer_to(season):
+        return series.rule_season(
+            name='Show.mkv', metadata={'season': season},
+            foldermatch=foldermatch, transfer={})['transfer']['transfer_to']
+
+    assert transfer_to(1) == os.path.join(show, 'Season 1')
+    assert transfer_to(2) == os.path.join(show, 'Season 2 (2012)')
+    # Created once, then found in the index
+    assert transfer_to(3) == os.path.join(show, 'Season 3')
+    assert transfer_to(3) == os.path.join(show, 'Season 3')
+    # guessit returns a list for files spanning several seasons
+    assert transfer_to([1, 2]) == os.path.join(show, 'Season 1')
@@ -0,0 +1,25 @@
+import pytest
+
+from .utils import RuleBookFileInjector
+
+from video_file_organizer.config import RuleBookFile
+from video_file_organizer.templates import TemplateCache
+
+
+def test_template_cache():
+    templates = TemplateCache(max_entries=2)
+    first = templates.get('One_Piece_{{ episode }}')
+    assert templates.get('One_Piece_{{ episode }}') is first
+    assert templates.render('{{ title }}', {'title': 'Arrow'}) == 'Arrow'
+
+    templates.get('{{ season }}')
+    assert templates.get('One_Piece_{{ episode }}') is not first
+
+
+def test_invalid_format_title_fails_on_load(tmp_dir):
+    rule_book_injector = RuleBookFileInjector(tmp_dir)
+    rule_book_injector.update(
+        'series', {'One Piece': 'parent-dir format-title "{{ episode"'})
+
+    with pytest.raises(ValueError):
+        RuleBookFile(rule_book_injector.path)
@@ -0,0 +1,402 @@
+import os
+
+import pytest
+
+from .utils import ConfigFileInjector
+from video_file_organizer import copier
+from video_file_organizer.config import ConfigFile
+from video_file_organizer import transferer as transferer_module
+from video_file_organizer.deleter import Deleter
+from video_file_organizer.journal import TransferJournal, PARTIAL_SUFFIX
+from video_file_organizer.models import VideoFile
+from video_file_organizer.transferer import Transferer
+from video_file_organizer.utils import Observer, Observee
+
+
+def make_vfile(input_dir, output_dir, content=b'video', episode=1):
+    release = f'Show.S01E{episode:02d}-GRP'
+    root_path = os.path.join(input_dir, release)
+    os.mkdir(root_path)
+    path = os.path.join(root_path, release + '.mkv')
+    with open(path, 'wb') as f:
+        f.write(content)
+    open(os.path.join(root_path, release + '.nfo'), 'w').close()
+
+    return VideoFile(
+        name=release + '.mkv',
+        path=path,
+        root_path=root_path,
+        transfer={'transfer_to': output_dir})
+
+
+@pytest.mark.parametrize(
+    "mode", ['auto', 'copy', 'move', 'hardlink', 'reflink'])
+def test_transfer_modes(transfer_dirs, mode):
+    input_dir, output_dir = transfer_dirs
+    vfile = make_vfile(input_dir, output_dir)
+
+    with Transferer(mode) as transferer:
+        transferer.transfer_vfile(vfile)
+
+    destination = os.path.join(output_dir, vfile.name)
+    with open(destination, 'rb') as f:
+        assert f.read() == b'video'
+    assert not os.path.exists(vfile.root_path)
+
+
+def test_transfer_invalid_mode():
+    with pytest.raises(ValueError):
+        Transferer('teleport')
+
+
+def test_transfer_vfiles_concurrently(transfer_dirs, recorder):
+    input_dir, output_dir = transfer_dirs
+    vfiles = []
+    for number in range(1, 7):
+        vfiles.append(make_vfile(
+            input_dir, output_dir, b'%d' % number, episode=number))
+
+    with Transferer('copy', workers=3, per_device=2) as transferer:
+        transferer.transfer_vfiles(vfiles)
+
+    assert sorted(map(id, recorder.transferred)) == sorted(map(id, vfiles))
+    for vfile in vfiles:
+        assert os.path.exists(os.path.join(output_dir, vfile.name))
+        assert not os.path.exists(vfile.root_path)
+
+
+@pytest.mark.parametrize("backend", copier.BACKENDS)
+def test_copy_file_backends(tmp_dir, monkeypatch, backend):
+    source = os.path.join(tmp_dir, 'source.mkv')
+    destination = os.path.join(tmp_dir, 'destination.mkv')
+    content = os.urandom(3 * 1024 * 1024 + 7)
+    with open(source, 'wb') as f:
+        f.write(content)
+    monkeypatch.setattr(copier, 'BACKENDS', [backend])
+
+    result = copier.copy_file(source, destination, fsync=True)
+
+    assert result.backend == backend[0]
+    assert result.size == len(content)
+    with open(destination, 'rb') as f:
+        assert f.read() == content
+
+
+def test_copy_file_falls_back_when_nothing_is_copied(tmp_dir, monkeypatch):
+    source = os.path.join(tmp_dir, 'source.mkv')
+    destination = os.path.join(tmp_dir, 'destination.mkv')
+    content = os.urandom(1024)
+    with open(source, 'wb') as f:
+        f.write(content)
+    # Like copy_file_range on some FUSE and network filesystems
+    monkeypatch.setattr(os, 'copy_file_range', lambda *args: 0)
+    monkeypatch.setattr(os, 'sendfile', lambda *args: 0)
+
+    result = copier.copy_file(source, destination)
+
+    assert result.backend == 'buffered'
+    with open(destination, 'rb') as f:
+        assert f.read() == content
+
+
+def test_copy_file_short_copy(tmp_dir, monkeypatch):
+    source = os.path.join(tmp_dir, 'source.mkv')
+    destination = os.path.join(tmp_dir, 'destination.mkv')
+    with open(source, 'wb') as f:
+        f.write(os.urandom(1024))
+
+    def short_copy(src, dst, throttle):
+        dst.write(src.read(512))
+    monkeypatch.setattr(copier, 'BACKENDS', [('short', short_copy)])
+
+    with pytest.raises(OSError):
+        copier.copy_file(source, destination)
+
+
+@pytest.mark.parametrize("backend", copier.BACKENDS)
+def test_copy_file_rate_limit(tmp_dir, monkeypatch, backend):
+    source = os.path.join(tmp_dir, 'source.mkv')
+    destination = os.path.join(tmp_dir, 'destination.mkv')
+    with open(source, 'wb') as f:
+        f.write(os.urandom(20 * 1024 * 1024))
+    monkeypatch.setattr(copier, 'BACKENDS', [backend])
+    clock = [0.0]
+    monkeypatch.setattr(copier.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(
+        copier.time, 'sleep',
+        lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+
+    limiter = copier.RateLimiter(4 * 1024 * 1024)
+    copier.copy_file(source, destination, limiters=[limiter])
+
+    # A second worth of burst, then 16MB at 4MB/s
+    assert clock[0] == pytest.approx(4)
+
+
+@pytest.mark.parametrize("option", ['transfer_workers', 'transfer_per_device'])
+@pytest.mark.parametrize("value", [0, -1, 'two'])
+def test_transfer_counts_are_validated(tmp_dir, option, value):
+    config_injector = ConfigFileInjector(tmp_dir)
+    config_injector.update({
+        "series_dirs": [tmp_dir], "input_dir": tmp_dir, option: value})
+    with pytest.raises(ValueError):
+        ConfigFile(config_injector.path)
+    with pytest.raises(ValueError):
+        Transferer(**{option.replace('transfer_', ''): 0})
+
+
+def test_transfer_order(transfer_dirs, recorder):
+    input_dir, output_dir = transfer_dirs
+    vfiles = [make_vfile(input_dir, output_dir, b'x' * size, episode=number)
+              for number, size in enumerate([30, 10, 20], 1)]
+
+    with Transferer('copy', order='smallest-first') as transferer:
+        transferer.transfer_vfiles(vfiles)
+
+    assert recorder.transferred == [vfiles[1], vfiles[2], vfiles[0]]
+
+
+def test_journal_replay(tmp_dir, transfer_dirs):
+    input_dir, output_dir = transfer_dirs
+    copied = make_vfile(input_dir, output_dir, episode=1)
+    interrupted = make_vfile(input_dir, output_dir, episode=2)
+
+    # A run that died while copying the second file
+    journal = TransferJournal(os.path.join(tmp_dir, 'journal.jsonl'))
+    for vfile in [copied, interrupted]:
+        destination = os.path.join(output_dir, vfile.name)
+        journal.started(vfile.path, destination, vfile.root_path,
+                        partial=destination + PARTIAL_SUFFIX)
+        open(destination + PARTIAL_SUFFIX, 'w').close()
+        if vfile is copied:
+            os.replace(destination + PARTIAL_SUFFIX, destination)
+            journal.done(vfile.path, destination, vfile.root_path)
+
+    TransferJournal(journal.path).replay()
+
+    assert not os.path.exists(copied.root_path)
+    assert os.path.exists(interrupted.path)
+    assert os.listdir(output_dir) == [copied.name]
+    assert not os.path.exists(journal.path)
+
+
+def test_journal_replay_keeps_files_never_attempted(tmp_dir, transfer_dirs):
+    input_dir, output_dir = transfer_dirs
+    root_path = os.path.join(input_dir, 'Show.S01-GRP')
+    os.mkdir(root_path)
+    sources = []
+    for name in ['a.mkv', 'b.mkv']:
+        sources.append(os.path.join(root_path, name))
+        open(sources[-1], 'w').close()
+
+    # A run that died right after transfering the first file of the pack
+    journal = TransferJournal(os.path.join(tmp_dir, 'journal.jsonl'))
+    journal.planned((source, root_path) for source in sources)
+    destination = os.path.join(output_dir, 'a.mkv')
+    journal.started(sources[0], destination, root_path)
+    os.replace(sources[0], destination)
+    journal.done(sources[0], destination, root_path)
+
+    TransferJournal(journal.path).replay()
+
+    assert os.listdir(root_path) == ['b.mkv']
+    assert os.listdir(output_dir) == ['a.mkv']
+
+
+@pytest.mark.parametrize("verify", ['full', 'sampled'])
+def test_copy_file_verify(tmp_dir, monkeypatch, verify):
+    source = os.path.join(tmp_dir, 'source.mkv')
+    destination = os.path.join(tmp_dir, 'destination.mkv')
+    with open(source, 'wb') as f:
+        f.write(os.urandom(5 * copier.BUFFER_SIZE // 2))
+
+    result = copier.copy_file(source, destination, verify=verify, samples=3)
+    assert result.backend == 'buffered+verify'
+
+    # What was hashed on the way differs from what ends up on disk
+    update = copier.Verifier.update
+
+    def corrupted_update(self, chunk, data):
+        if chunk == 2:
+            data = bytes(len(data))
+        update(self, chunk, data)
+
+    monkeypatch.setattr(copier.Verifier, 'update', corrupted_update)
+    with pytest.raises(copier.VerificationError):
+        copier.copy_file(source, destination, verify=verify, samples=3)
+
+
+def test_new_hash_xxhash_fallback(monkeypatch, caplog):
+    monkeypatch.setattr(copier, 'xxhash', None)
+    monkeypatch.setattr(copier, '_xxhash_fallback_logged', False)
+
+    for _ in range(2):
+        assert copier.new_hash('xxhash').name == 'blake2b'
+    assert caplog.text.count("xxhash package isn't installed") == 1
+
+
+def test_transfer_skips_identical_destination(transfer_dirs):
+    input_dir, output_dir = transfer_dirs
+    vfile = make_vfile(input_dir, output_dir)
+    destination = os.path.join(output_dir, vfile.name)
+    with open(destination, 'wb') as f:
+        f.write(b'video')
+
+    with Transferer('copy') as transferer:
+        transferer.transfer_vfile(vfile)
+        assert transferer.stats.files == 0
+
+    assert not os.path.exists(vfile.root_path)
+
+
+def test_transfer_compares_identical_destination_once(
+        transfer_dirs, monkeypatch):
+    input_dir, output_dir = transfer_dirs
+    vfile = make_vfile(input_dir, output_dir)
+    with open(os.path.join(output_dir, vfile.name), 'wb') as f:
+        f.write(b'video')
+
+    calls = []
+
+    def counted_files_identical(source, destination):
+        calls.append(source)
+        return True
+    monkeypatch.setattr(
+        transferer_module, 'files_identical', counted_files_identical)
+
+    with Transferer('copy') as transferer:
+        transferer.transfer_vfiles([vfile])
+        assert transferer.stats.files == 0
+
+    assert calls == [vfile.path]
+    assert not os.path.exists(vfile.root_path)
+
+
+def test_transfer_no_replace_keeps_different_destination(transfer_dirs):
+    input_dir, output_dir = transfer_dirs
+    vfile = make_vfile(input_dir, output_dir)
+    vfile.rules = ['no-replace']
+    destination = os.path.join(output_dir, vfile.name)
+    with open(destination, 'wb') as f:
+        f.write(b'older')
+
+    with Transferer('copy') as transferer:
+        transferer.transfer_vfile(vfile)
+
+    with open(destination, 'rb') as f:
+        assert f.read() == b'older'
+    assert os.path.exists(vfile.path)
+
+
+def test_transfer_deletes_roots_in_background(transfer_dirs):
+    input_dir, output_dir = transfer_dirs
+    vfiles = [make_vfile(input_dir, output_dir, episode=number)
+              for number in range(1, 4)]
+
+    with Transferer('copy', workers=2) as transferer:
+        transferer.transfer_vfiles(vfiles)
+        assert transferer.released_roots == \
+            set(vfile.root_path for vfile in vfiles)
+
+    for vfile in vfiles:
+        assert not os.path.exists(vfile.root_path)
+
+
+def test_transfer_interrupted_keeps_roots(tmp_dir, transfer_dirs):
+    input_dir, output_dir = transfer_dirs
+    root_path = os.path.join(input_dir, 'Show.S01-GRP')
+    os.mkdir(root_path)
+    vfiles = []
+    for name in ['a.mkv', 'b.mkv']:
+        path = os.path.join(root_path, name)
+        open(path, 'w').close()
+        vfiles.append(VideoFile(
+            name=name, path=path, root_path=root_path,
+            transfer={'transfer_to': output_dir}))
+
+    class FailingHook(Observer):
+        topics = ['on_transfer']
+
+        def update(self, *args, topic, **kwargs):
+            raise RuntimeError('hook failed')
+
+    journal = TransferJournal(os.path.join(tmp_dir, 'journal.jsonl'))
+    hook = FailingHook()
+    Observee.attach(hook)
+    try:
+        with pytest.raises(RuntimeError):
+            with Transferer('copy', journal=journal) as transferer:
+                transferer.transfer_vfiles(vfiles)
+    finally:
+        Observee.detach(hook)
+
+    assert sorted(os.listdir(root_path)) == ['a.mkv', 'b.mkv']
+    assert os.path.exists(journal.path)
+
+    # Settled by the next run
+    TransferJournal(journal.path).replay()
+    assert os.listdir(root_path) == ['b.mkv']
+
+
+def test_deleter_trash(tmp_dir, monkeypatch):
+    trash_dir = os.path.join(tmp_dir, 'trash')
+    folders = []
+    for name in ['Show.S01E01-GRP', 'Show.S01E02-GRP']:
+        folder = os.path.join(tmp_dir, name)
+        os.mkdir(folder)
+        open(os.path.join(folder, name + '.nfo'), 'w').close()
+        folders.append(folder)
+
+    deleter = Deleter(trash_dir)
+    to_trash = deleter._to_trash
+
+    def failing_to_trash(path, trash_dir):
+        if path == folders[0]:
+            raise PermissionError(path)
+        return to_trash(path, trash_dir)
+
+    # A failure doesn't stop the other deletions
+    monkeypatch.setattr(deleter, '_to_trash', failing_to_trash)
+    for folder in folders:
+        deleter.delete(folder)
+    deleter.close()
+    assert os.path.exists(folders[0])
+    assert os.listdir(trash_dir) == ['Show.S01E02-GRP']
+
+    # Purged by the next run
+    Deleter(trash_dir).close()
+    assert os.listdir(trash_dir) == []
+
+
+def test_transfer_plan_defers_what_doesnt_fit(transfer_dirs, monkeypatch):
+    input_dir, output_dir = transfer_dirs
+    vfiles = [make_vfile(input_dir, output_dir, b'x' * 10, episode=number)
+              for number in range(1, 4)]
+
+    class StatVFS:
+        f_bavail = 25
+        f_frsize = 1
+
+    monkeypatch.setattr(os, 'statvfs', lambda path: StatVFS)
+    with Transferer('copy') as transferer:
+        transferer.transfer_vfiles(vfiles)
+
+    assert not os.path.exists(vfiles[0].root_path)
+    assert not os.path.exists(vfiles[1].root_path)
+    assert os.path.exists(vfiles[2].path)
+    assert not os.path.exists(os.path.join(output_dir, vfiles[2].name))
+
+
+@pytest.mark.parametrize("mode", ['move', 'hardlink', 'reflink'])
+def test_transfer_plan_same_device_takes_no_space(
+        transfer_dirs, monkeypatch, mode):
+    input_dir, output_dir = transfer_dirs
+    vfile = make_vfile(input_dir, output_dir, b'x' * 10)
+
+    class StatVFS:
+        f_bavail = 0
+        f_frsize = 1
+
+    monkeypatch.setattr(os, 'statvfs', lambda path: StatVFS)
+    with Transferer(mode) as transferer:
+        assert transferer.plan([vfile]) == [vfile]
@@ -0,0 +1,20 @@
+from tests.fixtures import Recorder
+from video_file_organizer.utils import Observee
+
+
+def test_observee_subscriptions():
+    subscriber = Recorder(['test/after'])
+    listener = Recorder()
+    Observee.attach(subscriber)
+    Observee.attach(listener)
+    try:
+        Observee.notify(topic='test/before')
+        Observee.notify(topic='test/after')
+    finally:
+        Observee.detach(subscriber)
+        Observee.detach(listener)
+    Observee.notify(topic='test/after')
+
+    assert subscriber.topics_received == ['test/after']
+    assert listener.topics_received == ['test/before', 'test/after']
+    assert 'test/after' not in Observee._subscriptions
@@ -3,11 +3,14 @@ import zipfile
 import logging
 import argparse
 import shutil
+import tempfile
+import tracemalloc
 import configparser
 import subprocess
 
 from tests.utils import ConfigFileInjector, RuleBookFileInjector
 from tests.vars import SERIES_CONFIGPARSE
+from video_file_organizer.models import Entry, VideoFile
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -18,6 +21,9 @@ parser.add_argument("--mock",
 parser.add_argument("--systemd",
                     help="Creates systemd files",
                     action="store_true")
+parser.add_argument("--benchmark-memory",
+                    help="Measures the memory used per VideoFile and Entry",
+                    type=int, nargs='?', const=100000, metavar='COUNT')
 args = parser.parse_args()
 
 MOCK_FOLDER = os.path.join(
@@ -141,9 +147,51 @@ def setup_systemd():
     logging.info("Files are ready in 'systemd/'")
 
 
+def measure(create, count: int) -> float:
+    """Returns the bytes allocated per object by create, without the
+    strings given to it"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [create(position) for position in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return used / count
+
+
+def benchmark_memory(count: int):
+    names = [f'Show.S01E{position:05d}.mkv' for position in range(count)]
+    paths = [os.path.join('/input', name) for name in names]
+    vfile_size = measure(
+        lambda position: VideoFile(
+            name=names[position], path=paths[position], root_path='/input'),
+        count)
+
+    entries_count = min(count, 10000)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in names[:entries_count]:
+            open(os.path.join(tmp_dir, name), 'w').close()
+        dir_entries = list(os.scandir(tmp_dir))
+        entry_size = measure(
+            lambda position: Entry(
+                dir_entry=dir_entries[position], is_parent=False),
+            entries_count)
+
+    vfile = VideoFile(name=names[0], path=paths[0], root_path='/input')
+    get_attr_size = measure(lambda position: vfile.get_attr(), count)
+
+    logging.info(f"VideoFile: {vfile_size:.0f} bytes each")
+    logging.info(f"Entry: {entry_size:.0f} bytes each")
+    logging.info(f"get_attr(): {get_attr_size:.0f} bytes per call")
+
+
 if args.mock:
     setup_mock()
 
 
 if args.systemd:
     setup_systemd()
+
+
+if args.benchmark_memory:
+    benchmark_memory(args.benchmark_memory)
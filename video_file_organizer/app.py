@@ -6,12 +6,13 @@ import yg.lockfile
 from typing import Union
 
 from video_file_organizer.config import ConfigDirectory
+from video_file_organizer.cache import ScanIndex
 from video_file_organizer.models import VideoCollection, FolderCollection
 from video_file_organizer.rules.utils import RuleRegistry
 from video_file_organizer.matchers import OutputFolderMatcher, \
     RuleBookMatcher, MetadataMatcher
 from video_file_organizer.transferer import Transferer
-from video_file_organizer.utils import Observee
+from video_file_organizer.utils import Observee, MatchMemo
 
 logger = logging.getLogger('vfo.app')
 
@@ -27,6 +28,9 @@ class App:
         self.configdir = ConfigDirectory(config_dir)
         self.config = self.configdir.configfile
         self.rulebook = self.configdir.rulebookfile
+        self.scan_index = self.configdir.scanindex
+        self.metadata_cache = self.configdir.metadatacache
+        self.transfer_journal = self.configdir.transferjournal
 
         self.rule_registry = RuleRegistry()
 
@@ -41,29 +45,76 @@ class App:
                     os.path.join(tempfile.gettempdir(), 'vfolock'),
                     timeout=10):
 
+                # Settle what an interrupted run left behind
+                self.transfer_journal.replay()
+
+                # Files asked for explicitly are always processed
+                scan_index = None
+                if not kwargs.get('whitelist'):
+                    scan_index = self.scan_index
+                    scan_index.fingerprint = ScanIndex.make_fingerprint([
+                        self.config.path,
+                        self.rulebook.path,
+                        *self.config.series_dirs
+                    ])
+
                 output_folder = FolderCollection(self.config.series_dirs)
                 input_folder = VideoCollection(
                     self.config.input_dir,
+                    ignore=self.config.ignore,
                     videoextensions=self.config.videoextensions,
-                    whitelist=kwargs.get('whitelist'))
-
+                    whitelist=kwargs.get('whitelist'),
+                    scan_index=scan_index,
+                    max_depth=self.config.scan_max_depth)
+
+                metadata_matcher = MetadataMatcher(
+                    self.metadata_cache,
+                    workers=self.config.metadata_workers)
+                memo = MatchMemo()
                 operations = [
-                    MetadataMatcher(),
-                    RuleBookMatcher(self.rulebook),
-                    OutputFolderMatcher(output_folder),
+                    RuleBookMatcher(self.rulebook, memo),
+                    OutputFolderMatcher(output_folder, memo),
                 ]
 
                 with input_folder as ifolder:
-                    for vfile in ifolder:
+                    for vfile in metadata_matcher.parse_all(ifolder):
                         for operation in operations:
+                            if not vfile.valid:
+                                break
                             operation(vfile=vfile)
                         if not vfile.valid:
+                            if scan_index is not None:
+                                scan_index.mark_unmatched(vfile.path)
                             continue
+                self.metadata_cache.save()
+                logger.info(
+                    "Metadata: "
+                    f"{metadata_matcher.fast_parser.hits} fast path hits, "
+                    f"{metadata_matcher.fast_parser.misses} fast path misses, "
+                    f"{self.metadata_cache.hits} cache hits")
+                logger.info(f"Match memo: {memo.summary()}")
 
                 # Transfer
-                with Transferer() as transferer:
-                    for vfile in input_folder:
-                        transferer.transfer_vfile(vfile)
+                with Transferer(
+                        self.config.transfer_mode,
+                        workers=self.config.transfer_workers,
+                        per_device=self.config.transfer_per_device,
+                        fsync=self.config.transfer_fsync,
+                        journal=self.transfer_journal,
+                        verify=self.config.transfer_verify,
+                        verify_hash=self.config.transfer_verify_hash,
+                        verify_samples=self.config.transfer_verify_samples,
+                        trash_dir=self.config.trash_dir,
+                        rate_limit=self.config.transfer_rate_limit,
+                        rate_limit_per_destination=self.config
+                        .transfer_rate_limit_per_destination,
+                        order=self.config.transfer_order
+                ) as transferer:
+                    transferer.transfer_vfiles(input_folder)
+                self.config.hooks.close()
+
+                if scan_index is not None:
+                    scan_index.save()
 
         except yg.lockfile.FileLockTimeout:
             logger.info(
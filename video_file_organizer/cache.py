@@ -0,0 +1,213 @@
+import os
+import json
+import pickle
+import sqlite3
+import hashlib
+import logging
+import guessit
+
+from typing import Union, List
+
+logger = logging.getLogger('vfo.cache')
+
+
+class ScanIndex:
+    """Persistent state of the input_dir from the previous runs.
+
+    Every top level entry of the input_dir is recorded by path together with
+    its inode, size and mtime, the video files that were found in it and
+    the nested directories that were walked, so an unchanged directory
+    doesn't have to be walked again. Video files that
+    couldn't be matched are remembered with the fingerprint of the configs
+    they failed against and are skipped until either the file or the configs
+    change."""
+
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fingerprint: Union[str, None] = None
+        self.settings: Union[str, None] = None
+
+        data = self.load_file()
+        self._records: dict = data['records']
+        self._unmatched: dict = data['unmatched']
+        self._seen: set = set()
+
+    @staticmethod
+    def make_fingerprint(paths: list) -> str:
+        """Returns a hash of the mtimes of all the paths given"""
+        sha = hashlib.sha1()
+        for path in paths:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = 0
+            sha.update(f"{path}:{mtime};".encode())
+        return sha.hexdigest()
+
+    @staticmethod
+    def make_settings(max_depth: int, ignore: list, extensions: list) -> str:
+        """Returns a hash of the scanner settings the records depend on"""
+        settings = json.dumps([max_depth, sorted(ignore), sorted(extensions)])
+        return hashlib.sha1(settings.encode()).hexdigest()
+
+    def load_file(self) -> dict:
+        """Returns the content of the index file or an empty index"""
+        empty: dict = {'version': self.VERSION, 'records': {}, 'unmatched': {}}
+        if not os.path.exists(self.path):
+            return empty
+
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.info(f"Scan index unreadable, starting fresh: {e}")
+            return empty
+
+        if data.get('version') != self.VERSION:
+            logger.debug("Scan index version changed, starting fresh")
+            return empty
+        return data
+
+    def save(self):
+        """Writes the index to disk, dropping entries not seen this run"""
+        self._records = {
+            path: record for path, record in self._records.items()
+            if path in self._seen}
+        known = set(
+            vpath for record in self._records.values()
+            for _, vpath in record['vfiles'])
+        self._unmatched = {
+            path: fingerprint for path, fingerprint in self._unmatched.items()
+            if fingerprint == self.fingerprint and path in known}
+
+        data = {
+            'version': self.VERSION,
+            'records': self._records,
+            'unmatched': self._unmatched
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self._seen = set()
+        logger.debug(f"Saved scan index with {len(self._records)} records")
+
+    def lookup(self, path: str, stat: os.stat_result) -> Union[List, None]:
+        """Returns the video files recorded for path if it didn't change
+        since it was recorded"""
+        self._seen.add(path)
+        record = self._records.get(path)
+        if record is None:
+            return None
+        if record['inode'] != stat.st_ino \
+                or record['size'] != stat.st_size \
+                or record['mtime'] != stat.st_mtime_ns \
+                or record['settings'] != self.settings:
+            return None
+
+        # Nested directories only need a stat, not a scandir
+        for dir_path, (inode, mtime) in record['dirs'].items():
+            try:
+                dir_stat = os.stat(dir_path)
+            except FileNotFoundError:
+                return None
+            if dir_stat.st_ino != inode or dir_stat.st_mtime_ns != mtime:
+                return None
+        return record['vfiles']
+
+    def record(
+            self,
+            path: str,
+            stat: os.stat_result,
+            vfiles: list,
+            dirs: Union[dict, None] = None
+    ):
+        """Records the video files found in path, vfiles being a list of
+        [name, path] pairs and dirs the {path: [inode, mtime]} of the nested
+        directories walked"""
+        self._seen.add(path)
+        # A changed entry gets another chance at matching
+        for _, vpath in vfiles:
+            self._unmatched.pop(vpath, None)
+        self._records[path] = {
+            'inode': stat.st_ino,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'settings': self.settings,
+            'vfiles': vfiles,
+            'dirs': dirs or {}
+        }
+
+    def mark_unmatched(self, path: str):
+        self._unmatched[path] = self.fingerprint
+
+    def is_unmatched(self, path: str) -> bool:
+        """Checks if the video file at path failed to match against the
+        current configs"""
+        if self.fingerprint is None:
+            return False
+        return self._unmatched.get(path) == self.fingerprint
+
+
+class MetadataCache:
+    """Disk backed cache of the guessit results keyed by filename.
+
+    The guessit version is part of the key so an upgrade doesn't serve
+    stale results. Once it holds more than max_entries results, the least
+    recently used ones are evicted when the cache is saved."""
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = guessit.__version__
+        self.hits = 0
+        self.misses = 0
+
+        self._connection = sqlite3.connect(self.path, timeout=10)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "name TEXT NOT NULL, "
+            "version TEXT NOT NULL, "
+            "results BLOB NOT NULL, "
+            "last_used INTEGER NOT NULL, "
+            "PRIMARY KEY (name, version))")
+        self._clock = self._connection.execute(
+            "SELECT COALESCE(MAX(last_used), 0) FROM metadata").fetchone()[0]
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get(self, name: str) -> Union[dict, None]:
+        """Returns a fresh copy of the cached results for name"""
+        row = self._connection.execute(
+            "SELECT results FROM metadata WHERE name = ? AND version = ?",
+            (name, self.version)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._connection.execute(
+            "UPDATE metadata SET last_used = ? WHERE name = ? AND version = ?",
+            (self._tick(), name, self.version))
+        return pickle.loads(row[0])
+
+    def set(self, name: str, results: dict):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+            (name, self.version, pickle.dumps(results), self._tick()))
+
+    def save(self):
+        """Evicts the least recently used results and commits to disk"""
+        self._connection.execute(
+            "DELETE FROM metadata WHERE version != ?", (self.version,))
+        self._connection.execute(
+            "DELETE FROM metadata WHERE rowid NOT IN ("
+            "SELECT rowid FROM metadata ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,))
+        self._connection.commit()
+        logger.debug(f"Metadata cache saved: {self.hits} hits, "
+                     f"{self.misses} misses")
@@ -1,4 +1,5 @@
 import sys
+import json
 import yaml
 import subprocess
 import shlex
@@ -6,11 +7,17 @@ import configparser
 import os
 import logging
 
+from types import MappingProxyType
 from typing import Union, List
-from jinja2 import Template
+from jinja2 import TemplateSyntaxError
 
 from video_file_organizer.utils import Observer
+from video_file_organizer.cache import ScanIndex, MetadataCache
+from video_file_organizer.fuzzy import TrigramIndex, normalize_title
+from video_file_organizer.hooks import HookRunner
+from video_file_organizer.journal import TransferJournal
 from video_file_organizer.models import VideoFile
+from video_file_organizer.templates import TEMPLATES
 
 logger = logging.getLogger('vfo.config')
 
@@ -32,12 +39,91 @@ input_dir:
 #   - path/to/dir/1
 series_dirs:
 
-# List of files and folders to ignore from input_dir
+# List of files and folders to ignore from input_dir, glob patterns are
+# supported and matched at every depth
 # Example
 # ignore:
 #   - ".stversions"
+#   - "*.part"
 ignore:
 
+# How many directories deep to look for videos in input_dir, 1 only looks
+# inside the folders of input_dir, 2 also inside their sub folders
+# Default: 1
+# Example
+# scan_max_depth: 2
+scan_max_depth:
+
+# How the videos are transfered to the series_dirs
+# auto     --> move when on the same filesystem, copy otherwise
+# copy     --> always copy
+# move     --> always move
+# hardlink --> hardlink, copy when on different filesystems
+# reflink  --> copy-on-write clone, copy when not supported
+# Default: auto
+# Example
+# transfer_mode: auto
+transfer_mode:
+
+# Number of transfers running at the same time, and how many of them can
+# read from or write to the same device at once
+# Default: 4 and 1
+# Example
+# transfer_workers: 4
+# transfer_per_device: 1
+transfer_workers:
+transfer_per_device:
+
+# Maximum copy speed in MB/s, for all the transfers together and for the
+# transfers writing to the same destination filesystem. Moves and links
+# aren't throttled
+# Default: no limit
+# Example
+# transfer_rate_limit: 100
+# transfer_rate_limit_per_destination: 40
+transfer_rate_limit:
+transfer_rate_limit_per_destination:
+
+# Order the videos are transfered in
+# none           --> in the order they are found
+# smallest-first --> smallest files first, so most videos are available
+#                    sooner
+# oldest-first   --> oldest files first
+# Default: none
+# Example
+# transfer_order: smallest-first
+transfer_order:
+
+# Flush every copied file to disk before it counts as transfered
+# Default: false
+# Example
+# transfer_fsync: true
+transfer_fsync:
+
+# Verify copied files before their source gets deleted. The data is hashed
+# while it's being copied and compared with the destination read back
+# full    --> compares the whole file
+# sampled --> compares a block of transfer_verify_samples spots of the file
+# Hash can be xxhash (needs the optional xxhash package, installed with the
+# 'xxhash' extra, falls back to blake2b with a warning) or any hashlib
+# algorithm
+# Default: no verification, xxhash and 16 samples
+# Example
+# transfer_verify: sampled
+# transfer_verify_hash: xxhash
+# transfer_verify_samples: 16
+transfer_verify:
+transfer_verify_hash:
+transfer_verify_samples:
+
+# Directory the transfered source folders are moved into instead of being
+# deleted right away. It's emptied at the start of the next run. Keep it on
+# the same filesystem as input_dir, but not inside of it
+# Default: delete right away
+# Example
+# trash_dir: "path/to/trash"
+trash_dir:
+
 # Advanced Options
 
 # list of scripts to run before starting.
@@ -50,10 +136,47 @@ before_scripts:
 
 
 # list of scripts to run on_transfer.
+# They run in the background while the next videos are transfered
 # Example
 # on_transfer:
 #   - "path/to/script"
 on_transfer:
+
+# list of scripts to run once the videos are transfered, instead of once
+# per video. They get the transfered videos as a JSON list on stdin, and are
+# Jinja templates with the variables series (empty when grouped by run) and
+# count
+# Example
+# on_batch_complete:
+#   - "path/to/refresh_library --series '{{ series }}'"
+on_batch_complete:
+
+# Run on_batch_complete once per run or once per series
+# Default: run
+# Example
+# on_batch_group: series
+on_batch_group:
+
+# Number of hooks running at the same time, and seconds after which a hook
+# is killed
+# Default: 4 and no timeout
+# Example
+# hook_workers: 4
+# hook_timeout: 60
+hook_workers:
+hook_timeout:
+
+# Maximum number of parsed filenames kept in the metadata cache
+# Default: 50000
+# Example
+# metadata_cache_size: 50000
+metadata_cache_size:
+
+# Number of processes parsing the filenames in parallel
+# Default: number of cpus
+# Example
+# metadata_workers: 4
+metadata_workers:
 """
 
 RULEBOOK_FILE_TEMPLATE = """
@@ -71,6 +194,8 @@ RULEBOOK_FILE_TEMPLATE = """
 #                                example: "One_Piece_{{ episode }}"
 # alt-title                  --> Use the alternative title to search for file
 #                                video
+# no-replace                 --> Keep an existing file with the same name in
+#                                the destination instead of overwriting it
 
 [series]
 """
@@ -96,10 +221,28 @@ class ConfigDirectory:
         self.rulebookfile = RuleBookFile(
             os.path.join(self.path, 'rule_book.ini'))
 
+        # Initiate state handlers
+        self.scanindex = ScanIndex(
+            os.path.join(self.path, 'scan_index.json'))
+        self.metadatacache = MetadataCache(
+            os.path.join(self.path, 'metadata_cache.sqlite'),
+            max_entries=self.configfile.metadata_cache_size)
+        self.transferjournal = TransferJournal(
+            os.path.join(self.path, 'transfer_journal.jsonl'))
+
 
 class ConfigFile(Observer):
+    topics = ['on_transfer', 'on_batch_complete']
     VALID_OPTIONS = ['input_dir', 'series_dirs',
-                     'ignore', 'before_scripts', 'on_transfer']
+                     'ignore', 'before_scripts', 'on_transfer',
+                     'metadata_cache_size', 'metadata_workers',
+                     'scan_max_depth', 'transfer_mode', 'transfer_workers',
+                     'transfer_per_device', 'transfer_fsync',
+                     'transfer_verify', 'transfer_verify_hash',
+                     'transfer_verify_samples', 'transfer_rate_limit',
+                     'transfer_rate_limit_per_destination', 'transfer_order',
+                     'trash_dir', 'on_batch_complete', 'on_batch_group',
+                     'hook_workers', 'hook_timeout']
 
     def __init__(self, path: str):
 
@@ -121,8 +264,34 @@ class ConfigFile(Observer):
 
         self.input_dir = self.get_input_dir()
         self.series_dirs = self.get_series_dirs()
-        self.ignore = self._raw_config["ignore"]
+        self.ignore = self._raw_config["ignore"] or []
+        self.scan_max_depth = self._raw_config.get('scan_max_depth') or 1
+        self.transfer_mode = self.get_transfer_mode()
+        self.transfer_workers = self.get_transfer_count('transfer_workers', 4)
+        self.transfer_per_device = \
+            self.get_transfer_count('transfer_per_device', 1)
+        self.transfer_fsync = bool(self._raw_config.get('transfer_fsync'))
+        self.transfer_verify = self.get_transfer_verify()
+        self.transfer_verify_hash = \
+            self._raw_config.get('transfer_verify_hash') or 'xxhash'
+        self.transfer_verify_samples = \
+            self._raw_config.get('transfer_verify_samples') or 16
+        self.transfer_rate_limit = \
+            self._raw_config.get('transfer_rate_limit') or None
+        self.transfer_rate_limit_per_destination = \
+            self._raw_config.get('transfer_rate_limit_per_destination') \
+            or None
+        self.transfer_order = self.get_transfer_order()
+        self.trash_dir = self._raw_config.get('trash_dir') or None
+        self.on_batch_group = self.get_on_batch_group()
+        self.hooks = HookRunner(
+            workers=self._raw_config.get('hook_workers') or 4,
+            timeout=self._raw_config.get('hook_timeout') or None)
         self.videoextensions = ['mkv', 'm4v', 'avi', 'mp4', 'mov']
+        self.metadata_cache_size = \
+            self._raw_config.get('metadata_cache_size') or 50000
+        self.metadata_workers = \
+            self._raw_config.get('metadata_workers') or os.cpu_count() or 1
 
     def get_input_dir(self) -> str:
         """Returns the input_dir path from the config.yaml"""
@@ -147,6 +316,47 @@ class ConfigFile(Observer):
         logger.debug(f"Got series dirs '{dirs}'")
         return dirs
 
+    def get_transfer_mode(self) -> str:
+        """Returns the transfer_mode from the config.yaml"""
+        VALID_MODES = ['auto', 'copy', 'move', 'hardlink', 'reflink']
+        mode = self._raw_config.get('transfer_mode') or 'auto'
+        if mode not in VALID_MODES:
+            raise ValueError(f"'{mode}' is not a valid transfer_mode")
+        return mode
+
+    def get_transfer_count(self, option: str, default: int) -> int:
+        """Returns a count of concurrent transfers from the config.yaml"""
+        count = self._raw_config.get(option)
+        if count is None:
+            return default
+        if type(count) is not int or count < 1:
+            raise ValueError(f"'{count}' is not a valid {option}")
+        return count
+
+    def get_transfer_verify(self) -> Union[str, None]:
+        """Returns the transfer_verify mode from the config.yaml"""
+        VALID_MODES = ['full', 'sampled']
+        mode = self._raw_config.get('transfer_verify') or None
+        if mode is not None and mode not in VALID_MODES:
+            raise ValueError(f"'{mode}' is not a valid transfer_verify")
+        return mode
+
+    def get_transfer_order(self) -> str:
+        """Returns the transfer_order from the config.yaml"""
+        VALID_ORDERS = ['none', 'smallest-first', 'oldest-first']
+        order = self._raw_config.get('transfer_order') or 'none'
+        if order not in VALID_ORDERS:
+            raise ValueError(f"'{order}' is not a valid transfer_order")
+        return order
+
+    def get_on_batch_group(self) -> str:
+        """Returns the on_batch_group from the config.yaml"""
+        VALID_GROUPS = ['run', 'series']
+        group = self._raw_config.get('on_batch_group') or 'run'
+        if group not in VALID_GROUPS:
+            raise ValueError(f"'{group}' is not a valid on_batch_group")
+        return group
+
     def create_file_from_template(self):
         """Creates config.yaml from template"""
         if os.path.exists(self.path):
@@ -177,6 +387,15 @@ class ConfigFile(Observer):
                 raise ValueError(f"Value for '{field}' empty on config.yaml")
         logger.debug("All required fields are entered")
 
+        # Compiles the hook templates ahead of the first transfer
+        for option in ['on_transfer', 'on_batch_complete']:
+            for script in self._raw_config.get(option) or []:
+                try:
+                    TEMPLATES.get(script)
+                except TemplateSyntaxError as e:
+                    raise ValueError(
+                        f"Invalid template in {option} '{script}': {e}")
+
     def run_before_scripts(self):
         """Run all before_scripts in config"""
         # Checks if there are scripts to run
@@ -192,17 +411,56 @@ class ConfigFile(Observer):
     def update(self, *args, topic: str, **kwargs):
         if topic == 'on_transfer':
             self.run_on_transfer_scripts(kwargs['vfile'])
+        elif topic == 'on_batch_complete':
+            self.run_on_batch_complete_scripts(kwargs['vfiles'])
 
     def run_on_transfer_scripts(self, vfile: VideoFile):
+        """Queues the on_transfer scripts of vfile on the hook runner"""
         if not self._raw_config['on_transfer']:
             return
-        for script in self._raw_config['on_transfer']:
-            logger.debug(f"Running on_transfer for vfile: '{vfile.name}'")
-            values: dict = {}
-            values.update(vars(vfile))
-            values.update(vars(vfile)['metadata'])
-            rendered_script = Template(script).render(values)
-            self._run_script(rendered_script)
+        logger.debug(f"Queuing on_transfer for vfile: '{vfile.name}'")
+        values = vfile.get_attr()
+        values.update(vfile.metadata)
+        self.hooks.submit([
+            TEMPLATES.render(script, values)
+            for script in self._raw_config['on_transfer']])
+
+    def run_on_batch_complete_scripts(self, vfiles: List[VideoFile]):
+        """Queues the on_batch_complete scripts once per on_batch_group
+        with the vfiles of the group as JSON on stdin"""
+        if not self._raw_config.get('on_batch_complete'):
+            return
+        groups: dict = {}
+        for vfile in vfiles:
+            series = ''
+            if self.on_batch_group == 'series':
+                series = vfile.foldermatch.name if vfile.foldermatch \
+                    else vfile.metadata.get('title', '')
+            groups.setdefault(series, []).append(vfile)
+
+        for series, group in groups.items():
+            logger.debug(f"Queuing on_batch_complete for {len(group)} "
+                         f"vfiles of '{series or 'run'}'")
+            values = {'series': series, 'count': len(group)}
+            data = json.dumps([self._describe(vfile) for vfile in group])
+            self.hooks.submit(
+                [TEMPLATES.render(script, values)
+                 for script in self._raw_config['on_batch_complete']],
+                input=data.encode())
+
+    def _describe(self, vfile: VideoFile) -> dict:
+        destination = vfile.transfer['transfer_to']
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, vfile.name)
+        return {
+            'name': vfile.name,
+            'path': vfile.path,
+            'destination': destination,
+            'series': vfile.foldermatch.name if vfile.foldermatch else None,
+            'title': vfile.metadata.get('title'),
+            'season': vfile.metadata.get('season'),
+            'episode': vfile.metadata.get('episode')
+        }
 
     def _run_script(self, script: str):
         try:
@@ -227,6 +485,9 @@ class RuleBookFile:
 
         self.configparse = self.load_file()
         self.validate_rule_book()
+        self.series = SeriesRules(
+            (name, self.configparse.get('series', name))
+            for name in self.configparse.options('series'))
 
     def load_file(self) -> configparser.ConfigParser:
         """Returns configparser object for rule_book.ini"""
@@ -245,7 +506,7 @@ class RuleBookFile:
         rulebook_file.close()
 
     def list_of_series(self):
-        return self.configparse.options('series')
+        return list(self.series.names)
 
     def get_series_rule(self, name: str) -> str:
         return self.configparse.get('series', name)
@@ -297,3 +558,48 @@ class RuleBookFile:
             found = [rule for rule in rules if rule in invalid_pair]
             if len(found) > 1:
                 raise KeyError(f"Invalid pair {found}")
+
+        # Compiles the title format ahead of the first file
+        if 'format-title' in rules[:-1]:
+            title_format = rules[rules.index('format-title') + 1]
+            try:
+                TEMPLATES.get(title_format)
+            except TemplateSyntaxError as e:
+                raise ValueError(
+                    f"Invalid format-title template '{title_format}': {e}")
+
+
+class SeriesRules:
+    """Rules of the [series] section compiled once for lookups.
+
+    Titles are looked up by their normalized form first, then fuzzily
+    through a trigram index. The rules of every series are split ahead of
+    time into tuples."""
+
+    DIFF_CUTOFF = 0.7
+
+    def __init__(self, items):
+        self._rules = MappingProxyType({
+            name: tuple(shlex.split(rules or '')) for name, rules in items})
+        self._exact = MappingProxyType({
+            normalize_title(name): name for name in self._rules})
+        self._index = TrigramIndex(self._rules)
+
+    @property
+    def names(self) -> tuple:
+        return tuple(self._rules)
+
+    def get_rules(self, name: str) -> tuple:
+        return self._rules[name]
+
+    def match(self, title: str) -> Union[str, None]:
+        """Returns the name of the series matching title"""
+        name = self._exact.get(normalize_title(title))
+        if name is not None:
+            return name
+
+        difflib_match = self._index.get_close_matches(
+            title, n=1, cutoff=self.DIFF_CUTOFF)
+        if difflib_match:
+            return difflib_match[0]
+        return None
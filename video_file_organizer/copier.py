@@ -0,0 +1,392 @@
+import os
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import threading
+
+from functools import partial
+from typing import Callable, Iterable, Union
+
+try:
+    import xxhash  # type: ignore
+except ImportError:
+    xxhash = None
+
+logger = logging.getLogger('vfo.copier')
+
+CHUNK_SIZE = 64 * 1024 * 1024
+BUFFER_SIZE = 8 * 1024 * 1024
+SAMPLE_SIZE = 1024 * 1024
+
+VERIFY_MODES = ['full', 'sampled']
+
+# Errors meaning the backend can't be used for this pair of files
+UNSUPPORTED_ERRNOS = {
+    errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.ENOTSUP, errno.EBADF
+}
+
+
+class VerificationError(Exception):
+    pass
+
+
+# Whether the xxhash fallback was already logged
+_xxhash_fallback_logged = False
+
+
+def new_hash(name: str):
+    """Returns a hash object, 'xxhash' falls back to blake2b when the
+    xxhash package isn't installed"""
+    global _xxhash_fallback_logged
+    if name == 'xxhash':
+        if xxhash is not None:
+            return xxhash.xxh64()
+        if not _xxhash_fallback_logged:
+            _xxhash_fallback_logged = True
+            logger.warning(
+                "The xxhash package isn't installed, hashing with blake2b "
+                "instead. Install the 'xxhash' extra for faster checks")
+        name = 'blake2b'
+    return hashlib.new(name)
+
+
+class Verifier:
+    """Hashes the data of a copy as it goes through the buffer, then
+    compares it with the destination read back from disk.
+
+    In 'full' mode the whole file is hashed, in 'sampled' mode only a block
+    at the start of evenly spread chunks, always including the first and
+    the last chunk."""
+
+    def __init__(self, mode: str, hash_name: str, size: int, samples: int):
+        if mode not in VERIFY_MODES:
+            raise ValueError(f"Invalid verify mode '{mode}'")
+        self.mode = mode
+        self.hash_name = hash_name
+
+        self._hash = new_hash(hash_name)
+        self._samples: dict = {}
+        chunks = max(1, -(-size // BUFFER_SIZE))
+        if samples <= 1 or chunks == 1:
+            self._sampled = {0}
+        else:
+            self._sampled = set(
+                round(sample * (chunks - 1) / (samples - 1))
+                for sample in range(samples))
+
+    def update(self, chunk: int, data: memoryview):
+        if self.mode == 'full':
+            self._hash.update(data)
+        elif chunk in self._sampled:
+            self._samples[chunk] = self._digest(data[:SAMPLE_SIZE])
+
+    def _digest(self, data) -> str:
+        hasher = new_hash(self.hash_name)
+        hasher.update(data)
+        return hasher.hexdigest()
+
+    def check(self, path: str):
+        """Raises VerificationError if path doesn't match what was copied"""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            # Read from the disk rather than from the page cache
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+            if self.mode == 'full':
+                hasher = new_hash(self.hash_name)
+                while True:
+                    data = os.read(fd, BUFFER_SIZE)
+                    if not data:
+                        break
+                    hasher.update(data)
+                if hasher.hexdigest() != self._hash.hexdigest():
+                    raise VerificationError(f"Checksum mismatch for {path}")
+                return
+
+            for chunk, digest in self._samples.items():
+                data = os.pread(fd, SAMPLE_SIZE, chunk * BUFFER_SIZE)
+                if self._digest(data) != digest:
+                    raise VerificationError(
+                        f"Checksum mismatch for {path} at chunk {chunk}")
+        finally:
+            os.close(fd)
+
+
+class RateLimiter:
+    """Token bucket throttling all the copies sharing it to rate bytes per
+    second, with bursts of up to a second worth of data"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        """Takes size bytes out of the bucket, sleeping off any debt"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= size
+            debt = -self._tokens
+        if debt > 0:
+            time.sleep(debt / self.rate)
+
+
+class CopyResult:
+    def __init__(
+            self,
+            size: int,
+            seconds: float,
+            cpu_seconds: float,
+            backend: str
+    ):
+        self.size = size
+        self.seconds = seconds
+        self.cpu_seconds = cpu_seconds
+        self.backend = backend
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.size / self.seconds if self.seconds else 0.0
+
+    def __repr__(self) -> str:
+        return (f"<CopyResult {format_size(self.size)} in "
+                f"{self.seconds:.2f}s ({format_rate(self.bytes_per_second)}, "
+                f"{self.backend})>")
+
+
+class TransferStats:
+    """Thread safe totals of all the copies made during a run"""
+
+    def __init__(self):
+        self.files = 0
+        self.size = 0
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self._started = None
+        self._lock = threading.Lock()
+
+    def add(self, result: CopyResult):
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic() - result.seconds
+            self.files += 1
+            self.size += result.size
+            self.seconds += result.seconds
+            self.cpu_seconds += result.cpu_seconds
+
+    def summary(self) -> str:
+        if not self.files:
+            return "No files copied"
+        wall = time.monotonic() - self._started
+        cpu_share = self.cpu_seconds / self.seconds if self.seconds else 0.0
+        return (f"Copied {self.files} files, {format_size(self.size)} in "
+                f"{wall:.1f}s ({format_rate(self.size / wall)} total, "
+                f"{cpu_share:.0%} of copy time on cpu)")
+
+
+def format_size(size: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def format_rate(bytes_per_second: float) -> str:
+    return f"{format_size(bytes_per_second)}/s"
+
+
+def _cpu_time() -> float:
+    """CPU time of the calling thread, of the whole process on Python 3.6
+    which lacks time.thread_time"""
+    if hasattr(time, 'thread_time'):
+        return time.thread_time()
+    return time.process_time()
+
+
+def copy_file(
+        source: str,
+        destination: str,
+        fsync: bool = False,
+        verify: Union[str, None] = None,
+        hash_name: str = 'xxhash',
+        samples: int = 16,
+        limiters: Iterable[RateLimiter] = ()
+) -> CopyResult:
+    """Copies source to destination, keeping the data in the kernel when
+    possible. Tries copy_file_range, then sendfile, then falls back to
+    reads and writes with a large buffer. A backend that copies nothing
+    from a non empty file is skipped, and a copy of any other length than
+    the source raises OSError.
+
+    Every limiter is charged for each chunk written, chunks are kept small
+    while throttled so the rate stays smooth.
+
+    With verify, the data has to go through the buffer to be hashed on its
+    way, the destination is flushed to disk and checked against the hashes
+    without reading the source a second time"""
+    started = time.monotonic()
+    cpu_started = _cpu_time()
+
+    limiters = list(limiters)
+
+    def charge(size: int):
+        for limiter in limiters:
+            limiter.consume(size)
+    throttle = charge if limiters else None
+
+    with open(source, 'rb', buffering=0) as src, \
+            open(destination, 'wb', buffering=0) as dst:
+        size = os.fstat(src.fileno()).st_size
+        backends = BACKENDS
+        verifier = None
+        if verify:
+            verifier = Verifier(verify, hash_name, size, samples)
+            fsync = True
+            backends = [(
+                'buffered+verify', partial(_buffered, verifier=verifier))]
+
+        backend = None
+        for name, function in backends:
+            try:
+                function(src, dst, throttle)
+            except OSError as e:
+                # Only switch backends if nothing was written yet
+                if e.errno not in UNSUPPORTED_ERRNOS or dst.tell():
+                    raise
+                logger.debug(f"{name} unavailable for {source}: {e}")
+                src.seek(0)
+                continue
+            if size and not dst.tell():
+                # Some filesystems report the end of the file right away
+                # instead of failing
+                logger.debug(f"{name} copied nothing for {source}")
+                src.seek(0)
+                continue
+            backend = name
+            break
+
+        written = dst.tell()
+        if written != size:
+            raise OSError(
+                errno.EIO,
+                f"Copied {written} of {size} bytes from {source}",
+                destination)
+
+        if fsync:
+            os.fsync(dst.fileno())
+
+    if verifier is not None:
+        verifier.check(destination)
+    shutil.copymode(source, destination)
+
+    result = CopyResult(
+        size=size,
+        seconds=time.monotonic() - started,
+        cpu_seconds=_cpu_time() - cpu_started,
+        backend=str(backend))
+    logger.debug(f"Copied {os.path.basename(source)}: {result}")
+    return result
+
+
+def files_identical(
+        first: str,
+        second: str,
+        hash_name: str = 'xxhash'
+) -> bool:
+    """Cheap check that two files hold the same data, comparing their size
+    and the hashes of a block at their start, middle and end"""
+    size = os.stat(first).st_size
+    if os.stat(second).st_size != size:
+        return False
+
+    offsets = sorted(set([
+        0,
+        max(0, size // 2 - SAMPLE_SIZE // 2),
+        max(0, size - SAMPLE_SIZE)
+    ]))
+    digests: list = []
+    for path in [first, second]:
+        hasher = new_hash(hash_name)
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            for offset in offsets:
+                hasher.update(os.pread(fd, SAMPLE_SIZE, offset))
+        finally:
+            os.close(fd)
+        digests.append(hasher.hexdigest())
+    return digests[0] == digests[1]
+
+
+def _copy_file_range(src, dst, throttle: Union[Callable, None] = None):
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, "copy_file_range not available")
+    chunk_size = BUFFER_SIZE if throttle else CHUNK_SIZE
+    while True:
+        copied = os.copy_file_range(src.fileno(), dst.fileno(), chunk_size)
+        if not copied:
+            break
+        if throttle:
+            throttle(copied)
+
+
+def _sendfile(src, dst, throttle: Union[Callable, None] = None):
+    if not hasattr(os, 'sendfile'):
+        raise OSError(errno.ENOSYS, "sendfile not available")
+    chunk_size = BUFFER_SIZE if throttle else CHUNK_SIZE
+    offset = 0
+    while True:
+        sent = os.sendfile(dst.fileno(), src.fileno(), offset, chunk_size)
+        if not sent:
+            break
+        offset += sent
+        if throttle:
+            throttle(sent)
+
+
+def _buffered(
+        src,
+        dst,
+        throttle: Union[Callable, None] = None,
+        verifier: Union[Verifier, None] = None
+):
+    buffer = memoryview(bytearray(BUFFER_SIZE))
+    chunk = 0
+    while True:
+        read = _read_full(src, buffer)
+        if not read:
+            break
+        if verifier is not None:
+            verifier.update(chunk, buffer[:read])
+        chunk += 1
+        written = 0
+        while written < read:
+            written += dst.write(buffer[written:read])
+        if throttle:
+            throttle(read)
+
+
+def _read_full(src, buffer: memoryview) -> int:
+    """Fills the buffer unless the end of the file is reached, so chunks
+    always start at multiples of the buffer size"""
+    read = 0
+    while read < len(buffer):
+        count = src.readinto(buffer[read:])
+        if not count:
+            break
+        read += count
+    return read
+
+
+BACKENDS = [
+    ('copy_file_range', _copy_file_range),
+    ('sendfile', _sendfile),
+    ('buffered', _buffered),
+]
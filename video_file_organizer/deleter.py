@@ -0,0 +1,98 @@
+import os
+import time
+import errno
+import shutil
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+from video_file_organizer.journal import TransferJournal
+
+logger = logging.getLogger('vfo.deleter')
+
+
+class Deleter:
+    """Removes the transfered source roots on a background thread.
+
+    With a trash_dir, roots are renamed into it instead, which is instant
+    when the trash is on the same filesystem as the input dir. Whatever is
+    in the trash when the Deleter starts is purged in bulk on a second
+    thread while the run goes on. Failures are logged and never stop the
+    other deletions."""
+
+    def __init__(
+            self,
+            trash_dir: Union[str, None] = None,
+            journal: Union[TransferJournal, None] = None
+    ):
+        self.trash_dir = trash_dir
+        self.journal = journal
+        self._deleter = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='vfo-deleter')
+        self._purger = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='vfo-purger')
+
+        if trash_dir is not None:
+            os.makedirs(trash_dir, exist_ok=True)
+            # Only what previous runs left, this run's roots stay until the
+            # next one
+            for entry in os.listdir(trash_dir):
+                self._purger.submit(
+                    self._purge, os.path.join(trash_dir, entry))
+
+    def delete(self, path: str):
+        """Queues path for deletion"""
+        self._deleter.submit(self._delete, path)
+
+    def close(self):
+        """Waits for the queued deletions and the purge to finish"""
+        self._deleter.shutdown(wait=True)
+        self._purger.shutdown(wait=True)
+
+    def _delete(self, path: str):
+        if not os.path.lexists(path):
+            # Already moved away with the video file
+            logger.debug(f"Nothing left to delete for {path}")
+            return
+
+        try:
+            if not (self.trash_dir and self._to_trash(path, self.trash_dir)):
+                self._remove(path)
+        except OSError:
+            logger.exception(f"Deleting {path} FAILED")
+            return
+
+        if self.journal is not None:
+            self.journal.deleted(path)
+        logger.info(f"Deleted {os.path.basename(path)}")
+
+    def _to_trash(self, path: str, trash_dir: str) -> bool:
+        """Renames path into the trash, returns False if it's on another
+        filesystem"""
+        name = os.path.basename(path.rstrip(os.sep))
+        destination = os.path.join(trash_dir, name)
+        if os.path.lexists(destination):
+            destination += f'.{int(time.time() * 1000000)}'
+        try:
+            os.rename(path, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            logger.debug(f"Trash on another filesystem, removing {path}")
+            return False
+        return True
+
+    def _purge(self, path: str):
+        try:
+            self._remove(path)
+        except OSError:
+            logger.exception(f"Purging {path} from the trash FAILED")
+            return
+        logger.debug(f"Purged {os.path.basename(path)} from the trash")
+
+    def _remove(self, path: str):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
@@ -0,0 +1,77 @@
+import re
+import heapq
+import difflib
+import logging
+
+from collections import defaultdict, Counter
+from typing import Iterable, Iterator, List, Dict, Set, Tuple
+
+logger = logging.getLogger('vfo.fuzzy')
+
+
+def normalize_title(title: str) -> str:
+    """Returns title lowercased with punctuation collapsed to spaces"""
+    return re.sub(r'[^a-z0-9]+', ' ', title.lower()).strip()
+
+
+def trigrams(word: str) -> Set[str]:
+    """Returns the set of padded lowercase trigrams of word"""
+    padded = f"  {word.lower()} "
+    return set(padded[i:i+3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """Trigram index over a fixed list of names.
+
+    Returns the same matches as difflib.get_close_matches. Names are scored
+    in the order of the trigrams they share with the word being looked up,
+    so the best matches are found early, and the cheap upper bounds of
+    difflib against the scores found so far skip the full ratio for most
+    of the other names."""
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = list(dict.fromkeys(names))
+
+        self._index: Dict[str, List[int]] = defaultdict(list)
+        for position, name in enumerate(self.names):
+            for gram in trigrams(name):
+                self._index[gram].append(position)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def candidates(self, word: str) -> Iterator[str]:
+        """Yields every name, the ones sharing the most trigrams with word
+        first"""
+        shared: Counter = Counter()
+        for gram in trigrams(word):
+            shared.update(self._index.get(gram, ()))
+
+        for position, _ in shared.most_common():
+            yield self.names[position]
+        for position, name in enumerate(self.names):
+            if position not in shared:
+                yield name
+
+    def get_close_matches(
+            self, word: str, n: int = 3, cutoff: float = 0.6) -> List[str]:
+        """Same as difflib.get_close_matches against the indexed names"""
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        # The n best (score, name) so far, worst first
+        best: List[Tuple[float, str]] = []
+        for name in self.candidates(word):
+            matcher.set_seq1(name)
+            threshold = best[0][0] if len(best) == n else cutoff
+            # Equal scores are kept, difflib breaks ties on the name
+            if matcher.real_quick_ratio() < threshold \
+                    or matcher.quick_ratio() < threshold:
+                continue
+            score = matcher.ratio()
+            if score < threshold:
+                continue
+            if len(best) < n:
+                heapq.heappush(best, (score, name))
+            elif (score, name) > best[0]:
+                heapq.heapreplace(best, (score, name))
+        return [name for _, name in sorted(best, reverse=True)]
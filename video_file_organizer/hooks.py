@@ -0,0 +1,63 @@
+import os
+import signal
+import logging
+import threading
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+
+logger = logging.getLogger('vfo.hooks')
+
+
+class HookRunner:
+    """Runs hook scripts on a bounded pool of background threads.
+
+    Each job runs its scripts one after the other in a shell of its own
+    session, so a script going over the timeout is killed along with
+    everything it started. A failing or timed out script is logged and
+    doesn't stop the other scripts, jobs or the transfers."""
+
+    def __init__(self, workers: int = 4, timeout: Union[float, None] = None):
+        self.workers = workers
+        self.timeout = timeout
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._pool: Union[ThreadPoolExecutor, None] = None
+
+    def submit(self, scripts: List[str], input: Union[bytes, None] = None):
+        """Queues scripts to run in order, input is written to their stdin"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='vfo-hook')
+        self._pool.submit(self._run_all, scripts, input)
+
+    def close(self):
+        """Waits for all the queued scripts to finish"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _run_all(self, scripts: List[str], input: Union[bytes, None]):
+        for script in scripts:
+            try:
+                self.run(script, input)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                logger.exception(f"Hook '{script}' FAILED")
+
+    def run(self, script: str, input: Union[bytes, None] = None):
+        logger.debug(f"Running hook '{script}'")
+        process = subprocess.Popen(
+            script, shell=True, start_new_session=True,
+            stdin=subprocess.PIPE if input is not None else None)
+        try:
+            process.communicate(input, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+            raise
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, script)
+        logger.debug(f"Ran hook '{script}'")
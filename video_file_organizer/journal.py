@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import logging
+import threading
+
+from typing import IO, Iterable, Optional, Tuple, Union
+
+logger = logging.getLogger('vfo.journal')
+
+PARTIAL_SUFFIX = '.vfo-partial'
+
+
+class TransferJournal:
+    """Write-ahead journal of the transfers of a run.
+
+    Every file of a batch is logged as 'planned' before any transfer
+    starts, then as 'started' before any byte is written and as 'done' once
+    the file is renamed into place, and every source root as 'deleted' once
+    it's gone. If the run dies midway, replay() on the next start removes
+    the partial files and finishes the deletions the previous run didn't
+    get to, keeping every root that still holds a file which wasn't
+    transfered."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file: Optional[IO] = None
+
+    def log(self, event: str, **kwargs):
+        """Appends an event to the journal and flushes it to disk"""
+        self._write([{'event': event, **kwargs}])
+
+    def _write(self, events: list):
+        lines = ''.join(json.dumps(event) + '\n' for event in events)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(lines)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def planned(self, transfers: Iterable[Tuple[str, str]]):
+        """Logs the (source, root_path) of every file of a batch at once"""
+        self._write([
+            {'event': 'planned', 'source': source, 'root_path': root_path}
+            for source, root_path in transfers])
+
+    def started(
+            self,
+            source: str,
+            destination: str,
+            root_path: str,
+            partial: Union[str, None] = None
+    ):
+        self.log('started', source=source, destination=destination,
+                 root_path=root_path, partial=partial)
+
+    def done(self, source: str, destination: str, root_path: str):
+        self.log('done', source=source, destination=destination,
+                 root_path=root_path)
+
+    def deleted(self, root_path: str):
+        self.log('deleted', root_path=root_path)
+
+    def clear(self):
+        """Empties the journal once all of its transfers are settled"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def load(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+
+        events: list = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # The last line may be cut short by the crash
+                    logger.debug(f"Skipped unreadable journal line {line}")
+        return events
+
+    def replay(self):
+        """Rolls back the unfinished transfers of a previous run and resumes
+        the deletions of its finished ones"""
+        events = self.load()
+        if not events:
+            return
+        logger.info("Replaying the transfer journal of an interrupted run")
+
+        transfers: dict = {}
+        deleted: set = set()
+        for event in events:
+            if event['event'] == 'deleted':
+                deleted.add(event['root_path'])
+            else:
+                transfers[event['source']] = event
+
+        unfinished_roots: set = set()
+        done: list = []
+        for source, event in transfers.items():
+            if event['event'] == 'planned':
+                # Never attempted, deferred or left where it is
+                unfinished_roots.add(event['root_path'])
+                continue
+            if event['event'] == 'started':
+                partial = event.get('partial')
+                if partial and os.path.exists(partial):
+                    os.remove(partial)
+                    logger.info(f"Removed partial file {partial}")
+                # A rename might have gone through before the crash
+                if os.path.exists(source) \
+                        or not os.path.exists(event['destination']):
+                    unfinished_roots.add(event['root_path'])
+                    continue
+            done.append(event)
+
+        for event in done:
+            root_path = event['root_path']
+            if root_path in deleted:
+                continue
+            if root_path in unfinished_roots:
+                # Keep the rest of the root for the next run
+                if os.path.exists(event['source']):
+                    os.remove(event['source'])
+                    logger.info(f"Deleted transfered {event['source']}")
+                continue
+            if os.path.isdir(root_path):
+                shutil.rmtree(root_path)
+            elif os.path.lexists(root_path):
+                os.remove(root_path)
+            else:
+                continue
+            deleted.add(root_path)
+            logger.info(f"Deleted {os.path.basename(root_path)}")
+
+        self.clear()
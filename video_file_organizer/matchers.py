@@ -1,28 +1,111 @@
 import logging
 import guessit
-import difflib
-import shlex
+import itertools
 
-from typing import Union
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, Iterable, Iterator
 
 from video_file_organizer.models import VideoFile, FolderCollection
 from video_file_organizer.config import RuleBookFile
-from video_file_organizer.utils import VFileAddons
+from video_file_organizer.cache import MetadataCache
+from video_file_organizer.parsers import FastParser
+from video_file_organizer.fuzzy import TrigramIndex
+from video_file_organizer.utils import VFileAddons, MatchMemo
 
 logger = logging.getLogger('vfo.matachers')
 
 
+def parse_filename(name: str) -> dict:
+    """Returns the guessit results for name, runs in the worker processes"""
+    return dict(guessit.guessit(name))
+
+
 class MetadataMatcher:
-    def __init__(self):
-        pass
+    CHUNK_SIZE = 16
+
+    def __init__(
+            self,
+            cache: Union[MetadataCache, None] = None,
+            workers: int = 1
+    ):
+        self.cache = cache
+        self.workers = workers
+        self.fast_parser = FastParser()
+        self._parsed: dict = {}
+        self._pool: Union[ProcessPoolExecutor, None] = None
 
     @VFileAddons.vfile_consumer
     def __call__(self, vfile: VideoFile, **kwargs) -> Union[dict, bool]:
         return self.get_guessit(**kwargs)
 
+    def parse_all(self, vfiles: Iterable[VideoFile]) -> Iterator[VideoFile]:
+        """Runs the matcher on every vfile and yields them back in order.
+
+        With more than one worker, the filenames are parsed ahead in a
+        process pool one chunk in advance of the vfiles being yielded"""
+        if self.workers <= 1:
+            for vfile in vfiles:
+                self(vfile=vfile)
+                yield vfile
+            return
+
+        vfiles = iter(vfiles)
+        try:
+            pending = self._submit_chunk(vfiles)
+            while pending:
+                following = self._submit_chunk(vfiles)
+                for vfile, future in pending:
+                    if future is not None:
+                        results = future.result()
+                        self._parsed[vfile.name] = results
+                        if self.cache is not None:
+                            self.cache.set(vfile.name, results)
+                    self(vfile=vfile)
+                    yield vfile
+                pending = following
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _submit_chunk(self, vfiles: Iterator[VideoFile]) -> list:
+        """[(<VideoFile>, <Future>), (<VideoFile>, None)]"""
+        chunk: list = []
+        for vfile in itertools.islice(vfiles, self.workers * self.CHUNK_SIZE):
+            results = self.lookup(vfile.name)
+            if results is not None:
+                self._parsed[vfile.name] = results
+                chunk.append((vfile, None))
+                continue
+
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            chunk.append(
+                (vfile, self._pool.submit(parse_filename, vfile.name)))
+        return chunk
+
+    def lookup(self, name: str) -> Union[dict, None]:
+        """Returns the results for name from the fast path parser or the
+        cache, None if it needs to go through guessit"""
+        results = self.fast_parser.parse(name)
+        if results is None and self.cache is not None:
+            results = self.cache.get(name)
+        return results
+
+    def parse(self, name: str) -> dict:
+        """Returns the results for name, only calling guessit if needed"""
+        results = self.lookup(name)
+        if results is None:
+            results = parse_filename(name)
+            if self.cache is not None:
+                self.cache.set(name, results)
+        return results
+
     def get_guessit(self, name: str, **kwargs) -> Union[dict, bool]:
 
-        results = dict(guessit.guessit(name))
+        results = self._parsed.pop(name, None)
+        if results is None:
+            results = self.parse(name)
 
         if 'title' not in results:
             logger.info(f"Unable to find title for: '{name}'")
@@ -39,8 +122,13 @@ class MetadataMatcher:
 
 
 class RuleBookMatcher:
-    def __init__(self, rulebookfile: RuleBookFile):
+    def __init__(
+            self,
+            rulebookfile: RuleBookFile,
+            memo: Union[MatchMemo, None] = None
+    ):
         self.rulebook = rulebookfile
+        self.memo = memo or MatchMemo()
 
     @VFileAddons.vfile_consumer
     def __call__(self, vfile: VideoFile, **kwargs) -> Union[dict, bool]:
@@ -76,33 +164,41 @@ class RuleBookMatcher:
         if title is None:
             return []
 
-        # Get difflib_match from title
-        DIFF_CUTOFF = 0.7
-        difflib_match = difflib.get_close_matches(
-            title, self.rulebook.list_of_series(),
-            n=1, cutoff=DIFF_CUTOFF)
-
-        # Get difflib_match from alternative_title
-        if not difflib_match and alternative_title:
-            difflib_match = difflib.get_close_matches(
-                ' '.join([title, alternative_title]),
-                self.rulebook.list_of_series(),
-                n=1, cutoff=DIFF_CUTOFF
-            )
+        series = self.rulebook.series
+        match = self.memo.lookup(
+            'rulebook', (title, alternative_title),
+            lambda: self._match_series(title, alternative_title))
 
-        # Get the rules from the rule_book with difflib_match
-        rules = []
-        if difflib_match:
-            rules = shlex.split(
-                self.rulebook.get_series_rule(str(difflib_match[0])))
+        if match is None:
+            return []
+        return list(series.get_rules(match))
 
-        return rules
+    def _match_series(
+            self,
+            title: str,
+            alternative_title=None
+    ) -> Union[str, None]:
+        # Get match from title
+        match = self.rulebook.series.match(title)
+
+        # Get match from alternative_title
+        if match is None and alternative_title:
+            match = self.rulebook.series.match(
+                ' '.join([title, alternative_title]))
+
+        return match
 
 
 class OutputFolderMatcher:
-    def __init__(self, output_folder: FolderCollection):
+    def __init__(
+            self,
+            output_folder: FolderCollection,
+            memo: Union[MatchMemo, None] = None
+    ):
         self.output_folder = output_folder
+        self.memo = memo or MatchMemo()
         self.entries = self.output_folder.entries
+        self.index = TrigramIndex(self.output_folder.list_entry_names())
 
     @VFileAddons.vfile_consumer
     def __call__(self, vfile: VideoFile, **kwargs) -> Union[dict, bool]:
@@ -110,11 +206,10 @@ class OutputFolderMatcher:
 
     def get_match(
             self, name: str, metadata: dict, **kwargs) -> Union[dict, bool]:
-        index_match = difflib.get_close_matches(
-            metadata['title'],
-            self.output_folder.list_entry_names(),
-            n=1, cutoff=0.6
-        )
+        index_match = self.memo.lookup(
+            'outputfolder', metadata['title'],
+            lambda: self.index.get_close_matches(
+                metadata['title'], n=1, cutoff=0.6))
 
         if not index_match:
             logger.info("Match FAILED: " +
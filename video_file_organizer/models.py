@@ -1,23 +1,39 @@
 import os
+import re
+import fnmatch
 import logging
 
-from typing import Union, List
+from typing import Union, Iterator
+
+from video_file_organizer.cache import ScanIndex
 
 logger = logging.getLogger('vfo.models')
 
+SEASON_PATTERN = re.compile(r'^Season (\d+)(?!\d)', re.IGNORECASE)
+
 
 class EntryListBase:
-    _entries: list = []
+    # Lets Entry be slotted, the collections keep their __dict__
+    __slots__ = ('_entries', '_name_index', '_names', '_seasons')
+
+    _entries: list
+    # Built lazily from the entries, reset whenever entries is reassigned
+    _name_index: Union[dict, None]
+    _names: Union[tuple, None]
+    _seasons: Union[dict, None]
 
     @property
     def entries(self) -> list:
         if not self._entries:
-            self._entries = self.scan()
+            self.entries = self.scan()
         return self._entries
 
     @entries.setter
     def entries(self, entries: list):
         self._entries = entries
+        self._name_index = None
+        self._names = None
+        self._seasons = None
 
     def scan(self) -> list:
         return []
@@ -41,33 +57,48 @@ class EntryListBase:
         return len(self.entries)
 
     def get_entry_by_name(self, name: str):
-        for entry in self.entries:
-            if entry.name == name:
-                return entry
-        raise KeyError(f"Couldn't find an entry with the name '{name}'")
-
-    def list_entry_names(self) -> list:
-        data: list = []
-        for entry in self.entries:
-            data.append(entry.name)
-        return data
+        if self._name_index is None:
+            index: dict = {}
+            for entry in self.entries:
+                # The first entry with a given name wins
+                index.setdefault(entry.name, entry)
+            self._name_index = index
+        try:
+            return self._name_index[name]
+        except KeyError:
+            raise KeyError(f"Couldn't find an entry with the name '{name}'")
+
+    def list_entry_names(self) -> tuple:
+        if self._names is None:
+            self._names = tuple(entry.name for entry in self.entries)
+        return self._names
 
 
 class Entry(EntryListBase):
-    def __init__(self, is_parent=True, depth_level=0, **kwargs):
+    __slots__ = (
+        'path', 'name', 'is_dir', 'is_file', 'is_parent', 'depth_level'
+    )
 
+    def __init__(self, is_parent=True, depth_level=0, **kwargs):
+        self.path = None
+        self.name = None
+        self.is_dir = None
+        self.is_file = None
         if 'dir_entry' in kwargs.keys():
             self.by_dir_entry(kwargs['dir_entry'])
-        self._dir_entry = kwargs.get('dir_entry') or None
 
-        self.path = kwargs.get('path') or self.path or None
-        self.name = kwargs.get('name') or self.name or None
-        self.is_dir = kwargs.get('is_dir') or self.is_dir or None
-        self.is_file = kwargs.get('is_file') or self.is_file or None
+        self.path = kwargs.get('path') or self.path
+        self.name = kwargs.get('name') or self.name
+        self.is_dir = kwargs.get('is_dir') or self.is_dir
+        self.is_file = kwargs.get('is_file') or self.is_file
         self.is_parent = is_parent
         self.depth_level = depth_level
 
-        self._entries: list = []
+        # Shared empty tuple until the entry is scanned
+        self._entries = ()
+        self._name_index = None
+        self._names = None
+        self._seasons = None
 
     def by_dir_entry(self, dir_entry: os.DirEntry):
         self.path = dir_entry.path
@@ -89,6 +120,26 @@ class Entry(EntryListBase):
                 is_parent=False))
         return data
 
+    def get_season_path(self, season: int) -> Union[str, None]:
+        """Returns the path of the 'Season <season>' folder"""
+        return self._season_index().get(season)
+
+    def add_season(self, season: int, path: str):
+        """Records a season folder created after the entries were
+        scanned"""
+        self._season_index()[season] = path
+
+    def _season_index(self) -> dict:
+        seasons = self._seasons
+        if seasons is None:
+            seasons = {}
+            for entry in self.entries:
+                match = SEASON_PATTERN.match(entry.name)
+                if match and entry.is_dir():
+                    seasons.setdefault(int(match.group(1)), entry.path)
+            self._seasons = seasons
+        return seasons
+
     def __repr__(self) -> str:
         return f"<Entry '{self.name}'>"
 
@@ -107,7 +158,7 @@ class FolderCollection(EntryListBase):
 
         self.ignore = ignore
         self.whitelist = whitelist
-        self._entries = self.scan()
+        self.entries = self.scan()
 
     def scan(self) -> list:
         """[<Entry>, <Entry>]"""
@@ -125,22 +176,46 @@ class FolderCollection(EntryListBase):
 
 
 class VideoCollection(FolderCollection):
+    """Video files found in the input folder.
+
+    The folder is walked lazily: video files are yielded as they're found
+    the first time the collection is iterated over, and from memory after
+    that. Non video files are filtered out on the raw os.DirEntry."""
+
+    # Always skipped, matched case insensitively
+    DEFAULT_IGNORE = ['sample', '*.sample.*', '*-sample.*']
+
     def __init__(
             self,
             path: str,
             ignore: list = [],
             videoextensions: list = [],
-            whitelist: Union[None, list] = None
+            whitelist: Union[None, list] = None,
+            scan_index: Union[ScanIndex, None] = None,
+            max_depth: int = 1
     ):
         if type(path) is not str:
             raise TypeError("Input Folder can only be a single folder")
 
-        super().__init__(path, ignore, whitelist)
+        self.path = [path]
+        self.ignore = ignore
+        self.whitelist = whitelist
+        self.videoextensions = frozenset(videoextensions)
+        self.scan_index = scan_index
+        self.max_depth = max_depth
+        self.entries = []
 
-        self.videoextensions = videoextensions
+        self._ignore_pattern = re.compile(
+            '|'.join(fnmatch.translate(pattern)
+                     for pattern in [*self.DEFAULT_IGNORE, *ignore]),
+            re.IGNORECASE)
+
+        if self.scan_index is not None:
+            self.scan_index.settings = ScanIndex.make_settings(
+                max_depth, [*self.DEFAULT_IGNORE, *ignore], videoextensions)
 
         self._vfiles: list = []
-        self._scan_vfiles(self.entries)
+        self._scanner: Union[Iterator['VideoFile'], None] = self._walk()
 
     def __enter__(self):
         return self
@@ -149,58 +224,105 @@ class VideoCollection(FolderCollection):
         self._purge()
 
     def _purge(self):
-        del_list: list = []
         for vfile in self._vfiles:
             if not vfile.valid:
-                del_list.append(vfile)
-        for vfile in del_list:
-            self._vfiles.remove(vfile)
-            logger.debug(f"Purged vfile {vfile.name}")
-
-    def _scan_vfiles(self, entries: list) -> list:
-        """[<VideoFile>, <Videofile>]"""
-        data: List[VideoFile] = []
-        for entry in entries:
-            if entry.name.rpartition('.')[-1] in self.videoextensions:
-                self.add_vfile(
-                    entry.name,
-                    path=entry.path,
-                    root_path=entry.path)
-            if entry.is_dir():
-                for entry2 in entry:
-                    if entry2.name.rpartition('.')[-1] in self.videoextensions:
-                        self.add_vfile(
-                            entry2.name,
-                            path=entry2.path,
-                            root_path=entry.path)
-        return data
+                logger.debug(f"Purged vfile {vfile.name}")
+        self._vfiles = [vfile for vfile in self._vfiles if vfile.valid]
+
+    def _walk(self) -> Iterator['VideoFile']:
+        """Yields the video files of every top level entry"""
+        for root in os.scandir(self.path[0]):
+            if self._ignore_pattern.match(root.name):
+                continue
+            if self.whitelist and root.name not in self.whitelist:
+                continue
+
+            for name, path in self._scan_root(root):
+                if self.scan_index is not None \
+                        and self.scan_index.is_unmatched(path):
+                    logger.debug(f"Skipped previously unmatched {name}")
+                    continue
+                yield self.add_vfile(name, path=path, root_path=root.path)
+
+    def _scan_root(self, root: os.DirEntry) -> list:
+        """[[name, path], [name, path]]"""
+        if self.scan_index is None:
+            return list(self._find_videos(root, 0, {}))
+
+        try:
+            stat = root.stat()
+        except FileNotFoundError:
+            return []
+
+        found = self.scan_index.lookup(root.path, stat)
+        if found is None:
+            dirs: dict = {}
+            found = list(self._find_videos(root, 0, dirs))
+            self.scan_index.record(root.path, stat, found, dirs)
+        else:
+            logger.debug(f"Unchanged since last scan: {root.name}")
+        return found
 
-    def add_vfile(self, name: str, **kwargs):
+    def _find_videos(
+            self,
+            dir_entry: os.DirEntry,
+            depth: int,
+            dirs: dict
+    ) -> Iterator[list]:
+        """Yields [name, path] of the video files at or below dir_entry,
+        recording the nested directories walked into dirs"""
+        if dir_entry.name.rpartition('.')[-1] in self.videoextensions:
+            yield [dir_entry.name, dir_entry.path]
+
+        if depth >= self.max_depth or not dir_entry.is_dir():
+            return
+
+        if depth > 0:
+            stat = dir_entry.stat()
+            dirs[dir_entry.path] = [stat.st_ino, stat.st_mtime_ns]
+
+        for child in os.scandir(dir_entry.path):
+            if self._ignore_pattern.match(child.name):
+                continue
+            yield from self._find_videos(child, depth + 1, dirs)
+
+    def add_vfile(self, name: str, **kwargs) -> 'VideoFile':
         vfile = VideoFile()
         setattr(vfile, 'name', name)
         if kwargs:
             vfile.update(**kwargs)
         self._vfiles.append(vfile)
         logger.debug(f"Added vfile {name} with kwargs {kwargs}")
+        return vfile
 
     def __iter__(self):
-        for vfile in self._vfiles:
-            yield vfile
+        position = 0
+        while True:
+            if position == len(self._vfiles):
+                if self._scanner is None:
+                    return
+                try:
+                    next(self._scanner)
+                except StopIteration:
+                    self._scanner = None
+                    return
+            yield self._vfiles[position]
+            position += 1
 
 
 class VideoFile:
-    def __init__(self, **kwargs):
-        self._valid_attr = [
-            'name',
-            'metadata',
-            'rules',
-            'foldermatch',
-            'path',
-            'root_path',
-            'transfer',
-            'valid'
-        ]
+    __slots__ = (
+        'name',
+        'metadata',
+        'rules',
+        'foldermatch',
+        'path',
+        'root_path',
+        'transfer',
+        'valid'
+    )
 
+    def __init__(self, **kwargs):
         self.name: str = ''
         self.metadata: dict = {}
         self.rules: list = []
@@ -228,7 +350,4 @@ class VideoFile:
         logger.debug(f"Updated vfile {self.name} with kwargs {kwargs}")
 
     def get_attr(self, *args) -> dict:
-        data: dict = {}
-        for attr in self._valid_attr:
-            data.update({attr: getattr(self, attr)})
-        return data
+        return {attr: getattr(self, attr) for attr in self.__slots__}
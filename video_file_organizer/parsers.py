@@ -0,0 +1,162 @@
+import re
+import logging
+
+from typing import Union
+
+logger = logging.getLogger('vfo.parsers')
+
+CONTAINERS = 'mkv|m4v|avi|mp4|mov'
+
+# Show.Name.2014.S01E02.1080p.WEB.x264-GROUP.mkv
+SCENE_PATTERN = re.compile(
+    r'^(?P<title>[A-Za-z0-9\'&!,+-]+(?:[. _][A-Za-z0-9\'&!,+-]+)*?)'
+    r'(?:[. _](?P<year>(?:19|20)\d{2}))?'
+    r'[. _][Ss](?P<season>\d{1,2})[Ee](?P<episode>\d{1,3})'
+    r'(?P<rest>(?:[. _-].*)?)'
+    r'\.(?P<container>' + CONTAINERS + r')$')
+
+# Show Name - S01E02 - Episode Title.mkv
+LIBRARY_PATTERN = re.compile(
+    r'^(?P<title>[^\[\]()._]+?) - '
+    r'[Ss](?P<season>\d{1,2})[Ee](?P<episode>\d{1,3})'
+    r'(?: - [^\[\]()\d]+)?'
+    r'\.(?P<container>' + CONTAINERS + r')$')
+
+# [Group] Show Name - 123 [1080p].mkv
+ANIME_PATTERN = re.compile(
+    r'^\[(?P<release_group>[^\]]+)\] '
+    r'(?P<title>[^\[\]()]+?) - (?P<episode>\d{1,4})'
+    r'(?: \[(?P<screen_size>\d{3,4}p)\])?'
+    r'\.(?P<container>' + CONTAINERS + r')$')
+
+SCREEN_SIZE_PATTERN = re.compile(r'(?:^|[. _-])(\d{3,4}p)(?:$|[. _-])')
+# The last word of the name, with the release group after its last hyphen
+RELEASE_GROUP_PATTERN = re.compile(r'[A-Za-z0-9-]*-(?P<group>[A-Za-z0-9]+)$')
+DIGITS_PATTERN = re.compile(r'\d')
+WORD_PATTERN = re.compile(r"^[A-Za-z][A-Za-z'&!,+-]*$")
+# Multiple episodes or a second episode marker need guessit
+MULTI_EPISODE_PATTERN = re.compile(r'^[. _-]?[Ee]\d|^-[Ee]?\d')
+
+# Hyphenated source and codec tags guessit doesn't read a release group in
+SOURCE_TAGS = {
+    'web-dl', 'web-rip', 'web-hd', 'web-cap', 'dvd-rip', 'dvd-r', 'dvd-5',
+    'dvd-9', 'bd-rip', 'br-rip', 'hd-rip', 'blu-ray', 'hd-tv', 'hd-dvd',
+    'hdtv-rip', 'tv-rip', 'sat-rip', 'ppv-rip', 'vhs-rip', 'hd-cam',
+    'cam-rip', 'dts-hd', 'dts-x', 'h-264', 'h-265'
+}
+
+# Words guessit would take out of the title
+GUESSIT_WORDS = {
+    'us', 'uk', 'au', 'nz', 'ca', 'extended', 'repack', 'proper', 'complete',
+    'season', 'episode', 'part', 'special', 'ova', 'ona', 'movie'
+}
+
+
+class FastParser:
+    """Precompiled parser for the most common filename shapes.
+
+    Returns a result with the same keys as guessit for title, season,
+    episode, container and type, or None when the filename isn't one of the
+    shapes it's confident about so it can be handed over to guessit."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, name: str) -> Union[dict, None]:
+        results = self._parse_scene(name) \
+            or self._parse_library(name) \
+            or self._parse_anime(name)
+        if results is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return results
+
+    def _parse_scene(self, name: str) -> Union[dict, None]:
+        match = SCENE_PATTERN.match(name)
+        if not match:
+            return None
+
+        words = re.split(r'[. _]', match.group('title'))
+        if not self._confident(words):
+            return None
+
+        rest = match.group('rest')
+        if MULTI_EPISODE_PATTERN.match(rest):
+            return None
+
+        results: dict = {'title': ' '.join(words)}
+        if match.group('year'):
+            results['year'] = int(match.group('year'))
+        results['season'] = int(match.group('season'))
+        results['episode'] = int(match.group('episode'))
+
+        screen_size = SCREEN_SIZE_PATTERN.search(rest)
+        if screen_size:
+            results['screen_size'] = screen_size.group(1)
+        release_group = RELEASE_GROUP_PATTERN.search(rest)
+        if release_group \
+                and release_group.group().lower() not in SOURCE_TAGS:
+            results['release_group'] = release_group.group('group')
+
+        results['container'] = match.group('container')
+        results['type'] = 'episode'
+        return results
+
+    def _parse_library(self, name: str) -> Union[dict, None]:
+        match = LIBRARY_PATTERN.match(name)
+        if not match:
+            return None
+
+        title = match.group('title')
+        if ' - ' in title or not self._confident(title.split(' ')):
+            return None
+
+        return {
+            'title': title,
+            'season': int(match.group('season')),
+            'episode': int(match.group('episode')),
+            'container': match.group('container'),
+            'type': 'episode'
+        }
+
+    def _parse_anime(self, name: str) -> Union[dict, None]:
+        match = ANIME_PATTERN.match(name)
+        if not match:
+            return None
+
+        titles = match.group('title').split(' - ')
+        if len(titles) > 2:
+            return None
+        for title in titles:
+            if not self._confident(title.split(' ')):
+                return None
+
+        results: dict = {
+            'release_group': match.group('release_group'),
+            'title': titles[0]
+        }
+        if len(titles) == 2:
+            results['alternative_title'] = titles[1]
+        results['episode'] = int(match.group('episode'))
+        if match.group('screen_size'):
+            results['screen_size'] = match.group('screen_size')
+        results['container'] = match.group('container')
+        results['type'] = 'episode'
+        return results
+
+    def _confident(self, words: list) -> bool:
+        """Checks that the title words would be read the same way by
+        guessit"""
+        if not words or not all(words):
+            return False
+        for word in words:
+            if not WORD_PATTERN.match(word):
+                return False
+            # Acronyms like S.H.I.E.L.D and numbers are left to guessit
+            if len(word) == 1 or DIGITS_PATTERN.search(word):
+                return False
+            if word.lower() in GUESSIT_WORDS:
+                return False
+        return True
@@ -20,7 +20,8 @@ RuleRegistry.add_rule(
     'sub-dir',
     series.rule_sub_dir,
     'OutputFolderMatcher/after',
-    10
+    10,
+    argument='subdir_name'
 )
 
 RuleRegistry.add_rule(
@@ -35,7 +36,8 @@ RuleRegistry.add_rule(
     'format-title',
     series.rule_format_title,
     'OutputFolderMatcher/after',
-    20
+    20,
+    argument='title_format'
 )
 
 RuleRegistry.add_rule(
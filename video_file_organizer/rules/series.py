@@ -1,10 +1,9 @@
 import os
-import re
 import logging
-import jinja2
 
 from typing import Union
 from video_file_organizer.models import Entry
+from video_file_organizer.templates import TEMPLATES
 
 logger = logging.getLogger('vfo.series.rules')
 
@@ -20,23 +19,23 @@ def rule_season(
     logger.debug(f"Applying rule 'season' to {name}")
 
     if 'season' not in metadata:
-        logger.info("Rule 'season' FAILED: ",
+        logger.info("Rule 'season' FAILED: "
                     f"Undefined season number for file: {name}")
         return False
 
-    season = str(metadata['season'])
-    for entry in foldermatch:
-        search = re.search(f"^Season {season}", entry.name, re.IGNORECASE)
-        if search:
-            transfer['transfer_to'] = entry.path
-
-    if 'transfer_to' not in transfer:
-        path_to_new_season_dir = os.path.join(
-            foldermatch.path, f"Season {season}")
-        os.mkdir(path_to_new_season_dir)
-        transfer['transfer_to'] = path_to_new_season_dir
+    season = metadata['season']
+    if isinstance(season, list):
+        # Multi-season files (Show.S01E01.S02E01) go with their first season
+        season = season[0]
+    season = int(season)
+    season_path = foldermatch.get_season_path(season)
+    if season_path is None:
+        season_path = os.path.join(foldermatch.path, f"Season {season}")
+        os.mkdir(season_path)
+        foldermatch.add_season(season, season_path)
         logger.info("Rule 'season' " +
                     f"Created new Season {season} folder for Series {name}")
+    transfer['transfer_to'] = season_path
 
     logger.debug(f"Rule 'season' OK for {name}")
     return {'transfer': transfer}
@@ -59,14 +58,12 @@ def rule_parent_dir(
 def rule_sub_dir(
         name: str,
         foldermatch: Entry,
-        rules: list,
         transfer: dict,
+        subdir_name: str,
         **kwargs
 ) -> dict:
     """Sets the transfer_to a specified sub directory"""
     logger.debug(f"Applying rule 'sub-dir' to {name}")
-    subdir_name_index = rules.index('sub-dir') + 1
-    subdir_name = rules[subdir_name_index]
     if subdir_name not in foldermatch.list_entry_names():
         logger.info("Rule 'sub-dir' FAILED: " +
                     f"Cannot locate sub-dir {subdir_name}: {name}")
@@ -96,8 +93,8 @@ def rule_episode_only(name: str, metadata: dict, **kwargs) -> dict:
 def rule_format_title(
         name: str,
         metadata: dict,
-        rules: list,
         transfer: dict,
+        title_format: str,
         **kwargs
 ) -> dict:
     """Sets transfer_to filename to a specified name for transfer"""
@@ -107,10 +104,8 @@ def rule_format_title(
                     f"Missing container or transfer_to value: {name}")
         return {'transfer': transfer}
 
-    format_index = rules.index('format-title') + 1
-    template = jinja2.Template(
-        str(rules[format_index]) + "." + str(metadata['container']))
-    new_name = template.render(metadata)
+    new_name = TEMPLATES.render(str(title_format), metadata) \
+        + "." + str(metadata['container'])
     transfer['transfer_to'] = os.path.join(transfer['transfer_to'], new_name)
 
     logger.debug(f"Rule 'format-title' OK for {name}")
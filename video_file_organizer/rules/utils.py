@@ -1,58 +1,95 @@
+from functools import partial
+from typing import Callable, Dict, List, Union
+
 from video_file_organizer.models import VideoFile
 
 from video_file_organizer.utils import VFileAddons, Observer
 
 
 class RuleEntry:
-    def __init__(self, name: str, rule_function, topic: str, order: int):
+    def __init__(
+            self,
+            name: str,
+            rule_function,
+            topic: str,
+            order: int,
+            argument: Union[str, None] = None
+    ):
         self.name = name
         self.rule_function = rule_function
         self.topic = topic
         self.order = order
+        # Keyword the value following the rule in the rulebook is passed as
+        self.argument = argument
+
+    def bind(self, value: Union[str, None]) -> Callable:
+        """Returns the rule function with its argument bound to value"""
+        if self.argument is None:
+            return self.rule_function
+        return partial(self.rule_function, **{self.argument: value})
 
 
 class RuleRegistry(Observer):
-    _entries: list = []
+    # Entries bucketed by topic, each bucket sorted by order
+    _entries: Dict[str, List[RuleEntry]] = {}
+    # Bound rule functions of each topic, by the rules of a series
+    _pipelines: Dict[tuple, Dict[str, List[Callable]]] = {}
+
+    def __init__(self):
+        # Subscribed to the topics with rules registered when attached
+        self.topics = list(self._entries)
 
     def update(self, *arg, topic: str, **kwargs):
-        if 'RuleRegistry' not in topic:
+        # Rules only apply to single vfiles
+        if topic in self._entries and 'vfile' in kwargs:
             self.run_rules(topic=topic, **kwargs)
 
     @classmethod
-    def add_rule(cls, name, function, topic, order=10):
-        new_entry = RuleEntry(
+    def add_rule(cls, name, function, topic, order=10, argument=None):
+        entries = cls._entries.setdefault(topic, [])
+        entries.append(RuleEntry(
             name=name,
             rule_function=function,
             topic=topic,
-            order=order
-        )
-
-        for entry in cls._entries:
-            if entry.order > order:
-                cls._entries.insert(
-                    cls._entries.index(entry)-1,
-                    new_entry
-                )
-                return
-
-        cls._entries.append(
-            RuleEntry(
-                name=name,
-                rule_function=function,
-                topic=topic,
-                order=order
-            )
-        )
+            order=order,
+            argument=argument
+        ))
+        # Stable, rules of the same order keep their registration order
+        entries.sort(key=lambda entry: entry.order)
+        cls._pipelines.clear()
+
+    @classmethod
+    def get_pipeline(cls, rules: tuple, topic: str) -> List[Callable]:
+        """Returns the bound rule functions to run for rules on topic, in
+        order. Compiled once for every topic the first time rules are
+        seen"""
+        pipelines = cls._pipelines.get(rules)
+        if pipelines is None:
+            parsed = cls._parse(rules)
+            pipelines = cls._pipelines[rules] = {
+                entry_topic: [
+                    entry.bind(parsed[entry.name]) for entry in entries
+                    if entry.name in parsed]
+                for entry_topic, entries in cls._entries.items()}
+        return pipelines[topic]
+
+    @classmethod
+    def _parse(cls, rules: tuple) -> dict:
+        """Returns the rule names of rules with their argument, so an
+        argument is never taken for a rule"""
+        with_argument = set(
+            entry.name for entries in cls._entries.values()
+            for entry in entries if entry.argument is not None)
+        parsed: dict = {}
+        tokens = iter(rules)
+        for token in tokens:
+            parsed[token] = next(tokens, None) \
+                if token in with_argument else None
+        return parsed
 
     @VFileAddons.vfile_consumer
     def run_rules(self, vfile: VideoFile, topic: str, **kwargs):
-        rules_list: list = []
-        for entry in self._entries:
-            if entry.topic == topic:
-                rules_list.append(entry)
-
-        for entry in rules_list:
-            if entry.name in kwargs['rules']:
-                kwargs.update(entry.rule_function(**kwargs))
+        for rule in self.get_pipeline(tuple(kwargs['rules']), topic):
+            kwargs.update(rule(**kwargs))
 
         return kwargs
@@ -0,0 +1,41 @@
+import logging
+import threading
+import jinja2
+
+from collections import OrderedDict
+
+logger = logging.getLogger('vfo.templates')
+
+
+class TemplateCache:
+    """Bounded cache of the Jinja templates compiled by a single
+    Environment, keyed by their source"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.environment = jinja2.Environment()
+        self._templates: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source: str) -> jinja2.Template:
+        """Returns source compiled, raises jinja2.TemplateSyntaxError if it
+        isn't a valid template"""
+        with self._lock:
+            template = self._templates.get(source)
+            if template is not None:
+                self._templates.move_to_end(source)
+                return template
+
+        template = self.environment.from_string(source)
+        with self._lock:
+            self._templates[source] = template
+            if len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def render(self, source: str, values: dict) -> str:
+        return self.get(source).render(values)
+
+
+# Shared by the rules and the hooks
+TEMPLATES = TemplateCache()
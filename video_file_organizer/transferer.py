@@ -1,36 +1,311 @@
 import shutil
 import os
+import errno
 import logging
+import threading
 
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterable, List, Union
 
 from video_file_organizer.models import VideoFile
+from video_file_organizer.copier import copy_file, files_identical, \
+    format_size, RateLimiter, TransferStats
+from video_file_organizer.deleter import Deleter
+from video_file_organizer.journal import TransferJournal, PARTIAL_SUFFIX
 from video_file_organizer.utils import Observee
 
 logger = logging.getLogger('vfo.transferer')
 
 
+# ioctl request cloning a file on filesystems with reflink support
+FICLONE = 0x40049409
+
+
 class Transferer(Observee):
-    def __init__(self):
-        pass
+    MODES = ['auto', 'copy', 'move', 'hardlink', 'reflink']
+    ORDERS = ['none', 'smallest-first', 'oldest-first']
+
+    def __init__(
+            self,
+            mode: str = 'auto',
+            workers: int = 1,
+            per_device: int = 1,
+            fsync: bool = False,
+            journal: Union[TransferJournal, None] = None,
+            verify: Union[str, None] = None,
+            verify_hash: str = 'xxhash',
+            verify_samples: int = 16,
+            trash_dir: Union[str, None] = None,
+            rate_limit: Union[float, None] = None,
+            rate_limit_per_destination: Union[float, None] = None,
+            order: str = 'none'
+    ):
+        """Rate limits are in MB/s, for all the copies together and for the
+        copies writing to the same destination filesystem"""
+        if mode not in self.MODES:
+            raise ValueError(f"Invalid transfer mode '{mode}'")
+        if order not in self.ORDERS:
+            raise ValueError(f"Invalid transfer order '{order}'")
+        if workers < 1 or per_device < 1:
+            raise ValueError("Transfer workers and per_device need to be "
+                             "at least 1")
+        self.mode = mode
+        self.workers = workers
+        self.per_device = per_device
+        self.fsync = fsync
+        self.journal = journal
+        self.verify = verify
+        self.verify_hash = verify_hash
+        self.verify_samples = verify_samples
+        self.trash_dir = trash_dir
+        self.order = order
+        self.stats = TransferStats()
+
+        self.rate_limiter = None
+        if rate_limit:
+            self.rate_limiter = RateLimiter(rate_limit * 1024 * 1024)
+        self.rate_limit_per_destination = rate_limit_per_destination
+        self._destination_limiters: dict = {}
+        self._limiters_lock = threading.Lock()
 
     def __enter__(self):
         self.delete_list = []
+        # Roots that still hold a video file which wasn't transfered
+        self.kept_roots: set = set()
+        # Roots already handed over to the deleter
+        self.released_roots: set = set()
+        # Files of each root still to be transfered
+        self._remaining: Counter = Counter()
+        # Whether the existing destination of a source was found identical
+        # while planning, so transfer() doesn't read both files again
+        self._identical: dict = {}
+        self.deleter = Deleter(self.trash_dir, self.journal)
         return self
 
     def __exit__(self, type, value, traceback):
-        # Removes duplicates
-        self.delete_list = list(set(self.delete_list))
-
-        for source in self.delete_list:
-            if os.path.isfile(source):
-                os.remove(source)
-            elif os.path.isdir(source):
-                shutil.rmtree(source)
-            else:
-                raise TypeError(f'Unknown type for {source}')
-            logger.info(f"Deleted {os.path.basename(source)}")
+        logger.info(self.stats.summary())
+
+        if type is not None:
+            # The journal lets the next run settle what's left
+            logger.warning("Transfers interrupted, kept the roots that "
+                           "weren't deleted yet")
+            self.deleter.close()
+            return
+
+        for source in set(self.delete_list):
+            if source in self.kept_roots or self._remaining[source] > 0:
+                logger.info(f"Kept {os.path.basename(source)}: "
+                            "some of its files weren't transfered")
+                continue
+            self._release(source)
+        self.deleter.close()
+
+        # Everything journaled is either deleted or kept on purpose
+        if self.journal is not None:
+            self.journal.clear()
 
     def transfer_vfile(self, vfile: VideoFile):
+        self._check_vfile(vfile)
+        self._journal_planned([vfile])
+        if self._transfer_vfile(vfile):
+            self.notify(topic='on_transfer', vfile=vfile)
+
+    def transfer_vfiles(self, vfiles: Iterable[VideoFile]):
+        """Transfers all the vfiles on a thread pool.
+
+        A transfer only starts when neither its source nor its destination
+        device already has per_device transfers running, so different disks
+        are written to in parallel without thrashing any single one of
+        them. on_transfer is notified from the calling thread as each
+        transfer completes, and a source root is queued for deletion as soon
+        as its last file is transfered. on_batch_complete is notified once
+        with all the transfered vfiles at the end."""
+        checked: List[VideoFile] = []
+        for vfile in vfiles:
+            self._check_vfile(vfile)
+            checked.append(vfile)
+        # Before anything is deferred or transfered, so that a root is only
+        # ever deleted once all of its files are accounted for
+        self._journal_planned(checked)
+        if self.order != 'none':
+            checked.sort(key=self._order_key)
+        checked = self.plan(checked)
+
+        # A root is deleted as soon as all of its files are transfered
+        self._remaining.update(vfile.root_path for vfile in checked)
+        self._transfered: List[VideoFile] = []
+
+        if self.workers <= 1:
+            for vfile in checked:
+                self._run_isolated(vfile)
+        else:
+            self._run_pool(checked)
+
+        if self._transfered:
+            self.notify(topic='on_batch_complete', vfiles=self._transfered)
+
+    def _journal_planned(self, vfiles: List[VideoFile]):
+        if self.journal is not None and vfiles:
+            self.journal.planned(
+                (vfile.path, vfile.root_path) for vfile in vfiles)
+
+    def _run_pool(self, checked: List[VideoFile]):
+        # Pending transfers bucketed by the devices they use, in order
+        queues: dict = {}
+        for position, vfile in enumerate(checked):
+            try:
+                devices = self._devices(vfile)
+            except OSError:
+                self._on_failure(vfile)
+                continue
+            queues.setdefault(devices, deque()).append((position, vfile))
+
+        running: dict = {}
+        busy: Counter = Counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while queues or running:
+                # Start the earliest transfers whose devices have room left
+                while len(running) < self.workers:
+                    ready = [
+                        devices for devices in queues
+                        if all(busy[device] < self.per_device
+                               for device in devices)]
+                    if not ready:
+                        break
+                    devices = min(ready, key=lambda key: queues[key][0][0])
+                    _, vfile = queues[devices].popleft()
+                    if not queues[devices]:
+                        del queues[devices]
+                    busy.update(devices)
+                    future = pool.submit(self._transfer_vfile, vfile)
+                    running[future] = (vfile, devices)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    vfile, devices = running.pop(future)
+                    busy.subtract(devices)
+                    try:
+                        transfered = future.result()
+                    except Exception:
+                        self._on_failure(vfile)
+                        continue
+                    self._settle(vfile)
+                    if transfered:
+                        self._on_transfer(vfile)
+
+    def _run_isolated(self, vfile: VideoFile):
+        try:
+            transfered = self._transfer_vfile(vfile)
+        except Exception:
+            self._on_failure(vfile)
+            return
+        self._settle(vfile)
+        if transfered:
+            self._on_transfer(vfile)
+
+    def _on_transfer(self, vfile: VideoFile):
+        self._transfered.append(vfile)
+        self.notify(topic='on_transfer', vfile=vfile)
+
+    def plan(self, vfiles: List[VideoFile]) -> List[VideoFile]:
+        """Checks that the copies fit on their destination filesystems before
+        any of them starts, and reports the plan.
+
+        Returns the vfiles to transfer, in order. The ones that don't fit
+        in the space left are deferred to a later run and their roots
+        kept."""
+        free: dict = {}
+        folders: dict = {}
+        planned: Counter = Counter()
+        files: Counter = Counter()
+        accepted: List[VideoFile] = []
+        deferred: List[VideoFile] = []
+        for vfile in vfiles:
+            try:
+                size, folder = self._space_needed(vfile)
+                device = os.stat(folder).st_dev
+                if size and device not in free:
+                    stat = os.statvfs(folder)
+                    free[device] = stat.f_bavail * stat.f_frsize
+                    folders[device] = folder
+            except OSError:
+                # Fails when its turn comes
+                accepted.append(vfile)
+                continue
+            if size:
+                if planned[device] + size > free[device]:
+                    deferred.append(vfile)
+                    continue
+                planned[device] += size
+                files[device] += 1
+            accepted.append(vfile)
+
+        for device, size in planned.items():
+            logger.info(f"Transfer plan: copying {files[device]} files "
+                        f"({format_size(size)}) to {folders[device]}, "
+                        f"{format_size(free[device])} free")
+        for vfile in deferred:
+            logger.warning(f"Deferred {vfile.name}: not enough space left "
+                           f"in {vfile.transfer['transfer_to']}")
+            self.kept_roots.add(vfile.root_path)
+        return accepted
+
+    def _space_needed(self, vfile: VideoFile) -> tuple:
+        """Returns the bytes the transfer of vfile takes on its destination
+        filesystem and the closest existing folder of its destination"""
+        source = vfile.path
+        destination = vfile.transfer['transfer_to']
+        folder = destination
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, os.path.basename(source))
+        else:
+            folder = os.path.dirname(destination)
+        while not os.path.exists(folder):
+            folder = os.path.dirname(folder)
+
+        stat = os.stat(source)
+        same_device = stat.st_dev == os.stat(folder).st_dev
+        # A reflink shares the blocks of its source, only its fallback to a
+        # copy takes space and a later run picks up what doesn't fit
+        if same_device \
+                and self.mode in ['auto', 'move', 'hardlink', 'reflink']:
+            return 0, folder
+        if os.path.exists(destination):
+            identical = files_identical(source, destination)
+            self._identical[source] = identical
+            if identical:
+                return 0, folder
+        return stat.st_size, folder
+
+    def _order_key(self, vfile: VideoFile) -> tuple:
+        try:
+            stat = os.stat(vfile.path)
+        except OSError:
+            # Left for last, it fails when its turn comes
+            return (1, 0)
+        if self.order == 'smallest-first':
+            return (0, stat.st_size)
+        return (0, stat.st_mtime)
+
+    def _on_failure(self, vfile: VideoFile):
+        logger.exception(f"Transfer FAILED for {vfile.name}")
+        self.kept_roots.add(vfile.root_path)
+
+    def _settle(self, vfile: VideoFile):
+        """Releases the root of vfile once its last file is transfered"""
+        root_path = vfile.root_path
+        self._remaining[root_path] -= 1
+        if self._remaining[root_path] <= 0 \
+                and root_path not in self.kept_roots:
+            self._release(root_path)
+
+    def _release(self, root_path: str):
+        if root_path not in self.released_roots:
+            self.released_roots.add(root_path)
+            self.deleter.delete(root_path)
+
+    def _check_vfile(self, vfile: VideoFile):
         if not isinstance(vfile, VideoFile):
             raise TypeError("vfile needs to be an instance of VideoFile")
         if not hasattr(vfile, 'transfer'):
@@ -38,20 +313,157 @@ class Transferer(Observee):
         if 'transfer_to' not in vfile.transfer:
             raise KeyError("transfer_to key missing in transfer attribute")
 
+    def _transfer_vfile(self, vfile: VideoFile) -> bool:
         source = vfile.path
         destination = vfile.transfer['transfer_to']
         root_path = vfile.root_path
+        replace = 'no-replace' not in vfile.rules
 
-        self.transfer(source, destination, root_path)
-        self.notify(topic='on_transfer', vfile=vfile)
+        transfered = self.transfer(
+            source, destination, root_path, replace,
+            identical=self._identical.pop(source, None))
+        if not transfered:
+            self.kept_roots.add(root_path)
+        return transfered
+
+    def _devices(self, vfile: VideoFile) -> frozenset:
+        """Returns the st_dev of the source and destination of vfile"""
+        destination = vfile.transfer['transfer_to']
+        while not os.path.exists(destination):
+            destination = os.path.dirname(destination)
+        return frozenset(
+            [os.stat(vfile.path).st_dev, os.stat(destination).st_dev])
 
-    def transfer(self, source: str, destination: str, root_path: str):
+    def transfer(
+            self,
+            source: str,
+            destination: str,
+            root_path: str,
+            replace: bool = True,
+            identical: Union[bool, None] = None
+    ) -> bool:
+        """Transfers source to destination and schedules root_path for
+        deletion. Returns False if the file was left where it is.
+
+        identical is whether an existing destination was already compared
+        to source, None to compare them here"""
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, os.path.basename(source))
+
+        if os.path.exists(destination):
+            if identical is None:
+                identical = files_identical(source, destination)
+            if identical:
+                logger.info(f"Skipped copying {os.path.basename(source)}: "
+                            "identical file already at destination")
+                if self.journal is not None:
+                    self.journal.done(source, destination, root_path)
+                self._delete(root_path)
+                return True
+            if not replace:
+                logger.info(f"Skipped {os.path.basename(source)}: "
+                            f"{destination} exists and no-replace is set")
+                return False
+
+        if self.journal is not None:
+            self.journal.started(
+                source, destination, root_path,
+                partial=destination + PARTIAL_SUFFIX)
         self._copy(source, destination)
+        if self.journal is not None:
+            self.journal.done(source, destination, root_path)
+
         self._delete(root_path)
+        return True
 
     def _copy(self, source: str, destination: str):
-        logger.info(f"Transfering {os.path.basename(source)} to {destination}")
-        shutil.copy(source, destination)
+        mode = self.mode
+        if mode == 'auto':
+            mode = 'move' if self._same_device(source, destination) else 'copy'
+
+        logger.info(f"Transfering {os.path.basename(source)} to "
+                    f"{destination} ({mode})")
+        if mode == 'move':
+            self._move(source, destination)
+        elif mode == 'hardlink':
+            self._hardlink(source, destination)
+        elif mode == 'reflink':
+            self._reflink(source, destination)
+        else:
+            self._copy_data(source, destination)
+
+    def _copy_data(self, source: str, destination: str):
+        """Copies source next to destination under a temporary name and
+        renames it into place once complete"""
+        partial = destination + PARTIAL_SUFFIX
+        try:
+            result = copy_file(
+                source, partial,
+                fsync=self.fsync,
+                verify=self.verify,
+                hash_name=self.verify_hash,
+                samples=self.verify_samples,
+                limiters=self._limiters(destination))
+            os.replace(partial, destination)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        self.stats.add(result)
+        logger.info(f"Copied {os.path.basename(source)}: {result}")
+
+    def _limiters(self, destination: str) -> List[RateLimiter]:
+        """Returns the rate limiters a copy to destination is charged to"""
+        limiters: List[RateLimiter] = []
+        if self.rate_limiter is not None:
+            limiters.append(self.rate_limiter)
+        if self.rate_limit_per_destination:
+            device = os.stat(os.path.dirname(destination)).st_dev
+            with self._limiters_lock:
+                if device not in self._destination_limiters:
+                    self._destination_limiters[device] = RateLimiter(
+                        self.rate_limit_per_destination * 1024 * 1024)
+                limiters.append(self._destination_limiters[device])
+        return limiters
+
+    def _move(self, source: str, destination: str):
+        try:
+            os.replace(source, destination)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            self._copy_data(source, destination)
+            os.remove(source)
+
+    def _same_device(self, source: str, destination: str) -> bool:
+        destination_dir = os.path.dirname(destination)
+        return os.stat(source).st_dev == os.stat(destination_dir).st_dev
+
+    def _hardlink(self, source: str, destination: str):
+        tmp_destination = destination + PARTIAL_SUFFIX
+        try:
+            os.link(source, tmp_destination)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP):
+                raise
+            logger.debug(f"Hardlink not possible, copying instead: {e}")
+            self._copy_data(source, destination)
+            return
+        os.replace(tmp_destination, destination)
+
+    def _reflink(self, source: str, destination: str):
+        tmp_destination = destination + PARTIAL_SUFFIX
+        try:
+            import fcntl
+            with open(source, 'rb') as src, \
+                    open(tmp_destination, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copymode(source, tmp_destination)
+        except (ImportError, OSError) as e:
+            logger.debug(f"Reflink not possible, copying instead: {e}")
+            self._copy_data(source, destination)
+            return
+        os.replace(tmp_destination, destination)
 
     def _delete(self, source: str):
         self.delete_list.append(source)
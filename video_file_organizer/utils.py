@@ -1,6 +1,7 @@
 import abc
 import logging
-from typing import Set
+from collections import Counter
+from typing import Callable, Any, Dict, List, Iterable, Union
 
 from video_file_organizer.models import VideoFile
 
@@ -8,29 +9,83 @@ logger = logging.getLogger('vfo.utils')
 
 
 class Observer(metaclass=abc.ABCMeta):
+    # Topics the observer is subscribed to when attached, None for all
+    topics: Union[Iterable[str], None] = None
+
     @abc.abstractmethod
     def update(self, *arg, topic: str, **kwargs):
         pass
 
 
 class Observee:
-    _observers: Set[Observer] = set()
+    # Observers of every topic, and observers by the topic they subscribed to
+    _observers: List[Observer] = []
+    _subscriptions: Dict[str, List[Observer]] = {}
 
     @classmethod
-    def attach(cls, observer):
-        cls._observers.add(observer)
+    def attach(cls, observer, topics: Union[Iterable[str], None] = None):
+        """Subscribes observer to topics, defaulting to its own topics
+        attribute and to every topic when it has none"""
+        if topics is None:
+            topics = getattr(observer, 'topics', None)
+        if topics is None:
+            if observer not in cls._observers:
+                cls._observers.append(observer)
+            return
+        for topic in topics:
+            observers = cls._subscriptions.setdefault(topic, [])
+            if observer not in observers:
+                observers.append(observer)
 
     @classmethod
     def detach(cls, observer):
-        cls._observers.discard(observer)
+        if observer in cls._observers:
+            cls._observers.remove(observer)
+        for topic, observers in list(cls._subscriptions.items()):
+            if observer in observers:
+                observers.remove(observer)
+            if not observers:
+                del cls._subscriptions[topic]
 
     @classmethod
     def notify(cls, *args, topic: str, **kwargs):
+        subscribed = cls._subscriptions.get(topic)
+        if not subscribed and not cls._observers:
+            return
         logger.debug(f"********* {topic} *********")
-        for observer in cls._observers:
+        for observer in (subscribed or []) + cls._observers:
             observer.update(*args, topic=topic, **kwargs)
 
 
+class MatchMemo:
+    """Run scoped memo shared by the matchers so every distinct title is
+    only matched once per run"""
+
+    def __init__(self):
+        self._data: dict = {}
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+
+    def lookup(self, namespace: str, key: Any, compute: Callable) -> Any:
+        """Returns the memoized value of key, calling compute on a miss"""
+        memo_key = (namespace, key)
+        try:
+            value = self._data[memo_key]
+        except KeyError:
+            self.misses[namespace] += 1
+            value = self._data[memo_key] = compute()
+        else:
+            self.hits[namespace] += 1
+        return value
+
+    def summary(self) -> str:
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        return ', '.join(
+            f"{namespace} {self.hits[namespace]} hits/"
+            f"{self.misses[namespace]} misses"
+            for namespace in namespaces)
+
+
 class VFileAddons:
     def vfile_consumer(fn):
         def wrapper(self, vfile: VideoFile, **kwargs):
@@ -41,10 +96,8 @@ class VFileAddons:
 
             data = vfile.get_attr()
 
-            Observee.notify(
-                topic=f'{self.__class__.__name__}/before',
-                vfile=vfile
-            )
+            name = self.__class__.__name__
+            Observee.notify(topic=name + '/before', vfile=vfile)
 
             results = fn(self, vfile=vfile, **data, **kwargs)
 
@@ -53,10 +106,7 @@ class VFileAddons:
             else:
                 vfile.update(valid=False)
 
-            Observee.notify(
-                topic=f'{self.__class__.__name__}/after',
-                vfile=vfile
-            )
+            Observee.notify(topic=name + '/after', vfile=vfile)
 
             return
         return wrapper